@@ -13,6 +13,8 @@ from os import getenv
 SECRET_KEY = getenv("SECRET_KEY", "your-super-secret-key-change-this-in-production")
 ALGORITHM = getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "10080"))  # 7 days default
+STREAM_TOKEN_EXPIRE_SECONDS = int(getenv("STREAM_TOKEN_EXPIRE_SECONDS", "60"))
+STREAM_TOKEN_SCOPE = "job-events"
 
 
 def _hash_password(password: str, salt: str) -> str:
@@ -76,8 +78,38 @@ def verify_token(token: str) -> Optional[str]:
     if payload is None:
         return None
 
+    # Stream tokens only grant one job's progress stream
+    if "scope" in payload:
+        return None
+
     user_id = payload.get("sub")
     if user_id is None:
         return None
 
     return user_id
+
+
+def create_stream_token(user_id: str, job_id: str) -> str:
+    """
+    Create a short-lived token for one job's progress stream.
+    EventSource cannot send headers, so this token ends up in URLs (and logs).
+    """
+    return create_access_token(
+        data={"sub": user_id, "job": job_id, "scope": STREAM_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS)
+    )
+
+
+def verify_stream_token(token: str, job_id: str) -> Optional[str]:
+    """
+    Verify a stream token for job_id and return user_id if valid.
+    Returns None if token is invalid, expired or for another job.
+    """
+    payload = decode_access_token(token)
+    if payload is None:
+        return None
+
+    if payload.get("scope") != STREAM_TOKEN_SCOPE or payload.get("job") != job_id:
+        return None
+
+    return payload.get("sub")
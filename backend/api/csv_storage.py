@@ -1,16 +1,63 @@
 """
-CSV-based data storage for users and settings.
+CSV-based data storage for users, and an append-only log for settings.
 Simple implementation for small-scale applications.
+
+Settings are kept as compact, validated JSON bytes, one record per line:
+``user_id<TAB>updated_at<TAB>settings_json<LF>``. Compact JSON never
+contains a raw tab or newline, so records need no quoting or escaping and
+the stored bytes can be written straight into a response. The latest line
+for a user wins; an empty settings field marks a deletion. The log is
+compacted once most of it is superseded records.
+
+Several workers may share the files. Every write to a table holds that
+table's file lock (users.lock, user_settings.lock); settings records are
+appended with a single O_APPEND write, and start-up repair of a torn tail,
+compaction and migration hold the same lock, so they never cut off or drop
+another worker's append.
+
+Lookups are served from in-memory indexes. On start-up the indexes are
+loaded from a binary snapshot (see index_snapshot.py) when it matches the
+current CSV files, and rebuilt from the CSVs in a background thread
+otherwise; until then reads fall back to scanning the CSV files. Writes
+update the indexes in place and schedule a snapshot refresh in the
+background, so a burst of writes costs one snapshot write.
 """
 import csv
 import os
 import hashlib
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from dataclasses import dataclass, asdict
 import json
 import threading
 
+from api.index_snapshot import file_generation, load_snapshot, write_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking (run a single worker)
+    fcntl = None
+
+
+USER_FIELDS = ['id', 'username', 'email', 'password_hash', 'created_at', 'last_login']
+SETTINGS_FIELDS = ['user_id', 'settings_json', 'updated_at']
+# Order of the tables in the index snapshot and generation tuple
+INDEX_TABLES = ['users', 'settings']
+
+# Compact log once it is larger than this and mostly superseded records
+SETTINGS_COMPACT_MIN_BYTES = 1024 * 1024
+SETTINGS_COMPACT_RATIO = 2
+SETTINGS_SCAN_BLOCK = 64 * 1024
+# Coalesce snapshot refreshes after writes
+SNAPSHOT_DELAY = 5.0  # seconds
+
+
+def encode_settings(settings: Dict[str, Any]) -> bytes:
+    """Serialize settings to the compact JSON bytes that are stored and served."""
+    return json.dumps(settings, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
 
 @dataclass
 class User:
@@ -28,20 +75,38 @@ class User:
 
 @dataclass
 class UserSettings:
-    """User settings data model."""
+    """User settings data model. settings_json holds the stored UTF-8 JSON bytes."""
     user_id: str
-    settings_json: str
+    settings_json: bytes
     updated_at: str
 
     def get_settings(self) -> Dict[str, Any]:
         return json.loads(self.settings_json) if self.settings_json else {}
 
     def set_settings(self, settings: Dict[str, Any]):
-        self.settings_json = json.dumps(settings, ensure_ascii=False)
+        self.settings_json = encode_settings(settings)
 
     def to_dict(self) -> Dict[str, Any]:
         return asdict(self)
 
+    def to_line(self) -> bytes:
+        return b'\t'.join((
+            self.user_id.encode('utf-8'), self.updated_at.encode('utf-8'), self.settings_json
+        )) + b'\n'
+
+    @classmethod
+    def from_line(cls, line: bytes) -> Optional['UserSettings']:
+        """Parse a log line. Returns None for malformed lines."""
+        parts = line.split(b'\t', 2)
+        # Compact JSON has no raw tabs; one means a record was appended to a torn line
+        if len(parts) != 3 or b'\t' in parts[2]:
+            return None
+        return cls(
+            user_id=parts[0].decode('utf-8'),
+            settings_json=parts[2],
+            updated_at=parts[1].decode('utf-8')
+        )
+
 
 class CSVStorage:
     """CSV-based storage manager with thread-safe operations."""
@@ -49,12 +114,38 @@ class CSVStorage:
     def __init__(self, data_dir: str = "./data"):
         self.data_dir = data_dir
         self.users_file = os.path.join(data_dir, "users.csv")
-        self.settings_file = os.path.join(data_dir, "user_settings.csv")
+        self.settings_file = os.path.join(data_dir, "user_settings.dat")
+        self.legacy_settings_file = os.path.join(data_dir, "user_settings.csv")
+        # Cross-process write locks (flock), one per table
+        self.lock_files = {
+            'users': os.path.join(data_dir, "users.lock"),
+            'settings': os.path.join(data_dir, "user_settings.lock")
+        }
+        self.snapshot_file = os.path.join(data_dir, "index.snapshot")
         self.locks = {
             'users': threading.RLock(),  # Use RLock for reentrant locking
             'settings': threading.RLock()  # Use RLock for reentrant locking
         }
+
+        # In-memory indexes, valid for the CSV generation in self._generation
+        # (None while not loaded). Always acquired after the table locks.
+        self._index_lock = threading.RLock()
+        self._users: Dict[str, User] = {}
+        self._user_ids_by_username: Dict[str, str] = {}
+        self._user_ids_by_email: Dict[str, str] = {}
+        self._settings: Dict[str, UserSettings] = {}
+        self._generation: Optional[Tuple[int, ...]] = None
+        self._ready = threading.Event()
+        self._rebuilding = False
+        self._snapshot_timer: Optional[threading.Timer] = None
+        # Serializes snapshot writes; acquired before the index lock
+        self._snapshot_lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self.ready_seconds: Optional[float] = None
+        self.index_source: Optional[str] = None
+
         self._init_storage()
+        self._warm_up()
 
     def _init_storage(self):
         """Initialize CSV files with headers if they don't exist."""
@@ -66,17 +157,20 @@ class CSVStorage:
                 writer = csv.writer(f)
                 writer.writerow(['id', 'username', 'email', 'password_hash', 'created_at', 'last_login'])
 
-        # Initialize user_settings.csv
-        if not os.path.exists(self.settings_file):
-            with open(self.settings_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow(['user_id', 'settings_json', 'updated_at'])
+        # Initialize user_settings.dat, migrating settings from user_settings.csv
+        with self._file_lock('settings'):
+            if not os.path.exists(self.settings_file):
+                if os.path.exists(self.legacy_settings_file):
+                    self._migrate_legacy_settings()
+                else:
+                    open(self.settings_file, 'wb').close()
+            self._repair_settings_log()
 
     # ==================== User Operations ====================
 
     def create_user(self, username: str, email: str, password_hash: str) -> User:
         """Create a new user."""
-        with self.locks['users']:
+        with self.locks['users'], self._file_lock('users'):
             # Check if username or email already exists
             if self.get_user_by_username(username):
                 raise ValueError(f"Username '{username}' already exists")
@@ -102,57 +196,30 @@ class CSVStorage:
     def get_user_by_username(self, username: str) -> Optional[User]:
         """Get user by username."""
         with self.locks['users']:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['username'] == username:
-                        return User(
-                            id=row['id'],
-                            username=row['username'],
-                            email=row['email'],
-                            password_hash=row['password_hash'],
-                            created_at=row['created_at'],
-                            last_login=row.get('last_login')
-                        )
-            return None
+            if self._index_is_current('users'):
+                user_id = self._user_ids_by_username.get(username)
+                return self._users.get(user_id) if user_id else None
+            return self._scan_user('username', username)
 
     def get_user_by_email(self, email: str) -> Optional[User]:
         """Get user by email."""
         with self.locks['users']:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['email'] == email:
-                        return User(
-                            id=row['id'],
-                            username=row['username'],
-                            email=row['email'],
-                            password_hash=row['password_hash'],
-                            created_at=row['created_at'],
-                            last_login=row.get('last_login')
-                        )
-            return None
+            if self._index_is_current('users'):
+                user_id = self._user_ids_by_email.get(email)
+                return self._users.get(user_id) if user_id else None
+            return self._scan_user('email', email)
 
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """Get user by ID."""
         with self.locks['users']:
-            with open(self.users_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['id'] == user_id:
-                        return User(
-                            id=row['id'],
-                            username=row['username'],
-                            email=row['email'],
-                            password_hash=row['password_hash'],
-                            created_at=row['created_at'],
-                            last_login=row.get('last_login')
-                        )
-            return None
+            if self._index_is_current('users'):
+                return self._users.get(user_id)
+            return self._scan_user('id', user_id)
 
     def update_user_last_login(self, user_id: str):
         """Update user's last login time."""
-        with self.locks['users']:
+        with self.locks['users'], self._file_lock('users'):
+            before = file_generation(self.users_file)
             users = []
             with open(self.users_file, 'r', encoding='utf-8') as f:
                 reader = csv.DictReader(f)
@@ -162,93 +229,234 @@ class CSVStorage:
                     users.append(row)
 
             with open(self.users_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=['id', 'username', 'email', 'password_hash', 'created_at', 'last_login'])
+                writer = csv.DictWriter(f, fieldnames=USER_FIELDS)
                 writer.writeheader()
                 writer.writerows(users)
 
+            self._after_write(
+                'users', lambda: self._index_users(self._user_from_row(row) for row in users), before
+            )
+
     def get_all_users(self) -> List[User]:
         """Get all users."""
         with self.locks['users']:
-            users = []
+            if self._index_is_current('users'):
+                return list(self._users.values())
             with open(self.users_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    users.append(User(
-                        id=row['id'],
-                        username=row['username'],
-                        email=row['email'],
-                        password_hash=row['password_hash'],
-                        created_at=row['created_at'],
-                        last_login=row.get('last_login')
-                    ))
-            return users
+                return [self._user_from_row(row) for row in csv.DictReader(f)]
 
     # ==================== Settings Operations ====================
 
     def get_user_settings(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user settings."""
-        with self.locks['settings']:
-            if not os.path.exists(self.settings_file):
-                return None
+        record = self.get_user_settings_record(user_id)
+        return record.get_settings() if record else None
 
-            with open(self.settings_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['user_id'] == user_id:
-                        return json.loads(row['settings_json']) if row['settings_json'] else {}
-            return None
+    def get_user_settings_record(self, user_id: str) -> Optional[UserSettings]:
+        """Get the stored settings record (raw JSON bytes and updated_at)."""
+        with self.locks['settings']:
+            if self._index_is_current('settings'):
+                return self._settings.get(user_id)
+            return self._read_settings_records().get(user_id)
 
     def save_user_settings(self, user_id: str, settings: Dict[str, Any]) -> None:
         """Save or update user settings."""
+        record = UserSettings(
+            user_id=user_id,
+            settings_json=encode_settings(settings),
+            updated_at=datetime.utcnow().isoformat()
+        )
         with self.locks['settings']:
-            settings_records = []
-
-            # Read existing records
-            if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        settings_records.append(row)
-
-            # Update or add settings
-            updated = False
-            for record in settings_records:
-                if record['user_id'] == user_id:
-                    record['settings_json'] = json.dumps(settings, ensure_ascii=False)
-                    record['updated_at'] = datetime.utcnow().isoformat()
-                    updated = True
-                    break
-
-            if not updated:
-                settings_records.append({
-                    'user_id': user_id,
-                    'settings_json': json.dumps(settings, ensure_ascii=False),
-                    'updated_at': datetime.utcnow().isoformat()
-                })
-
-            # Write back to file
-            with open(self.settings_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=['user_id', 'settings_json', 'updated_at'])
-                writer.writeheader()
-                writer.writerows(settings_records)
+            with self._file_lock('settings'):
+                before = file_generation(self.settings_file)
+                self._append_settings_line(record.to_line())
+                self._after_write('settings', lambda: self._settings.__setitem__(user_id, record), before)
+            self._maybe_compact_settings()
 
     def delete_user_settings(self, user_id: str) -> None:
         """Delete user settings."""
         with self.locks['settings']:
-            if not os.path.exists(self.settings_file):
+            if self.get_user_settings_record(user_id) is None:
                 return
+            # Tombstone: a record with empty settings
+            tombstone = UserSettings(
+                user_id=user_id,
+                settings_json=b'',
+                updated_at=datetime.utcnow().isoformat()
+            )
+            with self._file_lock('settings'):
+                before = file_generation(self.settings_file)
+                self._append_settings_line(tombstone.to_line())
+                self._after_write('settings', lambda: self._settings.pop(user_id, None), before)
+            self._maybe_compact_settings()
+
+    # ==================== Index Management ====================
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the indexes have been loaded at least once since start-up."""
+        return self._ready.is_set()
+
+    def warmup_seconds(self) -> float:
+        """Time to ready, or time elapsed so far while warming up."""
+        if self.ready_seconds is not None:
+            return self.ready_seconds
+        return time.perf_counter() - self._started_at
+
+    def _warm_up(self) -> None:
+        """Load indexes from the snapshot, or rebuild them in the background."""
+        generation = self._current_generation()
+        tables = load_snapshot(self.snapshot_file, generation)
+        if tables is None:
+            self._start_rebuild()
+            return
+
+        user_rows, settings_rows = tables
+        with self._index_lock:
+            self._index_users(User(*row) for row in user_rows)
+            self._index_settings(
+                UserSettings(user_id, settings_json.encode('utf-8'), updated_at)
+                for user_id, settings_json, updated_at in settings_rows
+            )
+            self._mark_loaded(generation, 'snapshot')
 
-            settings_records = []
-            with open(self.settings_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['user_id'] != user_id:
-                        settings_records.append(row)
-
-            with open(self.settings_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=['user_id', 'settings_json', 'updated_at'])
-                writer.writeheader()
-                writer.writerows(settings_records)
+    def _start_rebuild(self) -> None:
+        """Rebuild the indexes from the CSV files in a background thread."""
+        with self._index_lock:
+            self._generation = None
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, name="storage-index-rebuild", daemon=True).start()
+
+    def _rebuild(self) -> None:
+        try:
+            while True:
+                generation = self._current_generation()
+                with open(self.users_file, 'r', encoding='utf-8') as f:
+                    users = [self._user_from_row(row) for row in csv.DictReader(f)]
+                settings = self._read_settings_records().values()
+
+                with self._index_lock:
+                    # A write happened while reading; read again
+                    if generation != self._current_generation():
+                        continue
+                    self._index_users(users)
+                    self._index_settings(settings)
+                    self._mark_loaded(generation, 'csv')
+                    self._rebuilding = False
+                self._write_snapshot()
+                return
+        except Exception as e:
+            print(f"Storage index rebuild failed: {e}")
+            with self._index_lock:
+                self._rebuilding = False
+
+    def _index_is_current(self, table: str) -> bool:
+        """Check that a table's index matches its CSV file; start a rebuild if not."""
+        with self._index_lock:
+            if self._generation is not None:
+                index = INDEX_TABLES.index(table)
+                current = file_generation(self._table_file(table))
+                if current == self._generation[index * 2:index * 2 + 2]:
+                    return True
+        # Not loaded yet, or changed by another process (e.g. another worker)
+        self._start_rebuild()
+        return False
+
+    def _after_write(self, table: str, update_index, before: Tuple[int, ...]) -> None:
+        """
+        Apply a write to the indexes (if loaded) and schedule a snapshot refresh.
+
+        `before` is the table file's generation just before the write, taken
+        under the file lock. If it is not the indexed one, another process
+        wrote in between and the indexes are rebuilt instead.
+        """
+        with self._index_lock:
+            if self._generation is None:
+                return
+            index = INDEX_TABLES.index(table)
+            if before != self._generation[index * 2:index * 2 + 2]:
+                self._start_rebuild()
+                return
+            update_index()
+            generation = list(self._generation)
+            generation[index * 2:index * 2 + 2] = file_generation(self._table_file(table))
+            self._generation = tuple(generation)
+            self._schedule_snapshot()
+
+    def _mark_loaded(self, generation: Tuple[int, ...], source: str) -> None:
+        self._generation = generation
+        self.index_source = source
+        if self.ready_seconds is None:
+            self.ready_seconds = time.perf_counter() - self._started_at
+        self._ready.set()
+
+    def _index_users(self, users) -> None:
+        by_id, by_username, by_email = {}, {}, {}
+        for user in users:
+            by_id[user.id] = user
+            by_username.setdefault(user.username, user.id)
+            by_email.setdefault(user.email, user.id)
+        self._users = by_id
+        self._user_ids_by_username = by_username
+        self._user_ids_by_email = by_email
+
+    def _index_settings(self, settings) -> None:
+        by_user = {}
+        for record in settings:
+            by_user.setdefault(record.user_id, record)
+        self._settings = by_user
+
+    def flush_snapshot(self) -> None:
+        """Write a pending snapshot refresh now (e.g. at shutdown)."""
+        with self._index_lock:
+            timer, self._snapshot_timer = self._snapshot_timer, None
+        if timer is not None:
+            timer.cancel()
+            self._write_snapshot()
+
+    def _schedule_snapshot(self) -> None:
+        """Refresh the snapshot after SNAPSHOT_DELAY. Called with the index lock held."""
+        if self._snapshot_timer is None:
+            self._snapshot_timer = threading.Timer(SNAPSHOT_DELAY, self._scheduled_snapshot)
+            self._snapshot_timer.daemon = True
+            self._snapshot_timer.start()
+
+    def _scheduled_snapshot(self) -> None:
+        with self._index_lock:
+            self._snapshot_timer = None
+        self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        """Write the indexes to the snapshot; only copying them holds the index lock."""
+        with self._snapshot_lock:
+            with self._index_lock:
+                if self._generation is None:
+                    return
+                generation = self._generation
+                users = list(self._users.values())
+                settings = list(self._settings.values())
+            try:
+                write_snapshot(self.snapshot_file, generation, [
+                    (len(USER_FIELDS), [
+                        [user.id, user.username, user.email, user.password_hash,
+                         user.created_at, user.last_login or '']
+                        for user in users
+                    ]),
+                    (len(SETTINGS_FIELDS), [
+                        [record.user_id, record.settings_json.decode('utf-8'), record.updated_at]
+                        for record in settings
+                    ]),
+                ])
+            except OSError as e:
+                print(f"Failed to write index snapshot: {e}")
+
+    def _table_file(self, table: str) -> str:
+        return self.users_file if table == 'users' else self.settings_file
+
+    def _current_generation(self) -> Tuple[int, ...]:
+        return file_generation(*(self._table_file(table) for table in INDEX_TABLES))
 
     # ==================== Helper Methods ====================
 
@@ -259,7 +467,151 @@ class CSVStorage:
         return f"user_{timestamp}_{unique_hash}"
 
     def _append_user(self, user: User) -> None:
-        """Append user to CSV file."""
+        """Append user to CSV file. Called under the users file lock."""
+        before = file_generation(self.users_file)
         with open(self.users_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['id', 'username', 'email', 'password_hash', 'created_at', 'last_login'])
+            writer = csv.DictWriter(f, fieldnames=USER_FIELDS)
             writer.writerow(user.to_dict())
+
+        def update_index():
+            self._users[user.id] = user
+            self._user_ids_by_username.setdefault(user.username, user.id)
+            self._user_ids_by_email.setdefault(user.email, user.id)
+
+        self._after_write('users', update_index, before)
+
+    def _user_from_row(self, row: Dict[str, str]) -> User:
+        return User(
+            id=row['id'],
+            username=row['username'],
+            email=row['email'],
+            password_hash=row['password_hash'],
+            created_at=row['created_at'],
+            last_login=row.get('last_login')
+        )
+
+    def _scan_user(self, field: str, value: str) -> Optional[User]:
+        """Find a user by scanning the CSV file (used while warming up)."""
+        with open(self.users_file, 'r', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                if row[field] == value:
+                    return self._user_from_row(row)
+        return None
+
+    def _read_settings_records(self) -> Dict[str, UserSettings]:
+        """Replay the settings log into the latest record per user."""
+        if not os.path.exists(self.settings_file):
+            return {}
+        with open(self.settings_file, 'rb') as f:
+            data = f.read()
+
+        records = {}
+        # The last element is empty, or a torn write that was never completed
+        for line in data.split(b'\n')[:-1]:
+            record = UserSettings.from_line(line)
+            if record is None:
+                continue
+            if record.settings_json:
+                records[record.user_id] = record
+            else:
+                records.pop(record.user_id, None)
+        return records
+
+    @contextmanager
+    def _file_lock(self, table: str):
+        """
+        Cross-process write lock on a table's file. Not reentrant: flock locks
+        belong to the open file, so a nested acquire would wait on itself.
+        """
+        with open(self.lock_files[table], 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _append_settings_line(self, line: bytes) -> None:
+        """Append one record. Called under the settings file lock."""
+        # Opened after locking, so a compaction cannot swap the file underneath
+        with open(self.settings_file, 'ab', buffering=0) as f:
+            f.write(line)
+
+    def _repair_settings_log(self) -> None:
+        """Drop a torn line left by an interrupted write. Called under the file lock."""
+        with open(self.settings_file, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            valid_end = self._settings_log_end(f, end)
+            if valid_end != end:
+                # The write was never acknowledged
+                f.truncate(valid_end)
+                print(f"Removed {end - valid_end} byte(s) of an incomplete settings record")
+
+    def _settings_log_end(self, f, end: int) -> int:
+        """Offset just past the last complete line of the settings log."""
+        if end == 0:
+            return 0
+        f.seek(end - 1)
+        if f.read(1) == b'\n':
+            return end
+
+        position = end
+        while position > 0:
+            block = min(SETTINGS_SCAN_BLOCK, position)
+            f.seek(position - block)
+            newline = f.read(block).rfind(b'\n')
+            if newline >= 0:
+                return position - block + newline + 1
+            position -= block
+        return 0
+
+    def _maybe_compact_settings(self) -> None:
+        """Rewrite the settings log without superseded records once they dominate it."""
+        if os.path.getsize(self.settings_file) < SETTINGS_COMPACT_MIN_BYTES:
+            return
+
+        # Cheap check against the index; the log itself is only replayed to compact
+        with self._index_lock:
+            live_bytes = sum(len(record.to_line()) for record in self._settings.values())
+        if os.path.getsize(self.settings_file) < live_bytes * SETTINGS_COMPACT_RATIO:
+            return
+
+        # Other workers' appends wait until the new file is in place
+        with self._file_lock('settings'):
+            # Replay the log rather than trust the index, which may lack other workers' records
+            before = file_generation(self.settings_file)
+            records = self._read_settings_records()
+            lines = [record.to_line() for record in records.values()]
+            if before[1] < sum(map(len, lines)) * SETTINGS_COMPACT_RATIO:
+                return
+
+            tmp_path = f"{self.settings_file}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.writelines(lines)
+            os.replace(tmp_path, self.settings_file)
+            self._after_write('settings', lambda: self._index_settings(records.values()), before)
+
+    def _migrate_legacy_settings(self) -> None:
+        """
+        Convert user_settings.csv (JSON quoted in CSV) to the settings log.
+        Called under the settings file lock.
+        """
+        records = {}
+        with open(self.legacy_settings_file, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    settings = json.loads(row['settings_json']) if row['settings_json'] else {}
+                except ValueError:
+                    print(f"Skipping invalid settings for user {row['user_id']}")
+                    continue
+                records.setdefault(row['user_id'], UserSettings(
+                    user_id=row['user_id'],
+                    settings_json=encode_settings(settings),
+                    updated_at=row['updated_at']
+                ))
+
+        tmp_path = f"{self.settings_file}.tmp"
+        with open(tmp_path, 'wb') as f:
+            for record in records.values():
+                f.write(record.to_line())
+        os.replace(tmp_path, self.settings_file)
+        os.replace(self.legacy_settings_file, f"{self.legacy_settings_file}.migrated")
+        print(f"Migrated settings for {len(records)} user(s) to {self.settings_file}")
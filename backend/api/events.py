@@ -0,0 +1,151 @@
+"""
+In-process event bus fanning job events out to streaming subscribers.
+
+Render workers publish from their own threads; events are handed to the
+event loop and copied into one bounded queue per subscriber. Events may
+carry a coalescing key: a newer event with the same key replaces a queued
+one, so a queue holds at most one progress frame and one state change per
+task. When a queue is full the oldest droppable (progress) frame is dropped.
+State changes are never dropped individually; if they alone overflow the
+queue, it is cleared and the reader receives a LAGGED_EVENT, on which it
+resends a full snapshot. A slow client sees fewer updates but never misses
+a result, and its queue never grows past the limit.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+DEFAULT_QUEUE_SIZE = 64
+
+# Returned by Subscription.get() after state events overflowed the queue
+LAGGED_EVENT = "lagged"
+
+
+@dataclass
+class Event:
+    """A published event. Events with a key are coalesced; droppable ones are progress frames."""
+    type: str
+    data: Dict[str, Any]
+    key: Optional[str] = None
+    droppable: bool = True
+    id: int = 0
+
+    def to_sse(self) -> bytes:
+        """Format as a Server-Sent Events frame."""
+        return (
+            f"id: {self.id}\nevent: {self.type}\n"
+            f"data: {json.dumps(self.data, separators=(',', ':'))}\n\n"
+        ).encode("utf-8")
+
+
+class Subscription:
+    """A subscriber's bounded event queue. Only used from the event loop."""
+
+    def __init__(self, topic: str, max_size: int = DEFAULT_QUEUE_SIZE):
+        self.topic = topic
+        self.max_size = max_size
+        self.dropped = 0
+        self.lagging = False
+        self._events: "OrderedDict[Any, Event]" = OrderedDict()
+        self._unkeyed = itertools.count()
+        self._available = asyncio.Event()
+
+    def put(self, event: Event) -> None:
+        if event.key is not None:
+            if self._events.pop(event.key, None) is not None:
+                self.dropped += 1
+            self._events[event.key] = event
+        else:
+            self._events[("event", next(self._unkeyed))] = event
+
+        # Make room by dropping the oldest progress frames
+        if len(self._events) > self.max_size:
+            for key in [k for k, e in self._events.items() if e.key is not None and e.droppable]:
+                if len(self._events) <= self.max_size:
+                    break
+                del self._events[key]
+                self.dropped += 1
+        # Only state events left: the reader resynchronizes from a snapshot instead
+        if len(self._events) > self.max_size:
+            self.dropped += len(self._events)
+            self._events.clear()
+            self.lagging = True
+        self._available.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        """
+        Wait for the next event. Returns None on timeout, and a LAGGED_EVENT
+        after the queue overflowed, superseding everything queued before it.
+        """
+        if not self._events and not self.lagging:
+            self._available.clear()
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.lagging:
+            self.lagging = False
+            self.dropped += len(self._events)
+            self._events.clear()
+            return Event(type=LAGGED_EVENT, data={}, droppable=False)
+        return self._events.popitem(last=False)[1]
+
+
+class EventBus:
+    """Topic-based publish/subscribe for job events."""
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, List[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Set the event loop that subscribers run on."""
+        self._loop = loop
+
+    def subscribe(self, topic: str) -> Subscription:
+        """Subscribe to a topic. Must be called from the event loop."""
+        subscription = Subscription(topic, self.queue_size)
+        self._subscribers.setdefault(topic, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.topic, [])
+        if subscription in subscribers:
+            subscribers.remove(subscription)
+        if not subscribers:
+            self._subscribers.pop(subscription.topic, None)
+
+    def publish(
+        self,
+        topic: str,
+        event_type: str,
+        data: Dict[str, Any],
+        key: Optional[str] = None,
+        droppable: bool = True
+    ) -> None:
+        """
+        Publish an event. Safe to call from any thread.
+        Events with a key replace a queued event with the same key; unless
+        droppable is False they may also be dropped when a queue is full.
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+        with self._lock:
+            event = Event(type=event_type, data=data, key=key, droppable=droppable, id=next(self._ids))
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, topic, event)
+        except RuntimeError:
+            # Loop shut down
+            pass
+
+    def _dispatch(self, topic: str, event: Event) -> None:
+        for subscription in self._subscribers.get(topic, []):
+            subscription.put(event)
@@ -0,0 +1,263 @@
+"""
+Batch render jobs over finalized uploads.
+
+A job renders a list of uploaded photos with the same options on a worker
+pool. Task state changes, per-task progress and aggregate throughput/ETA
+are published on the event bus under the job's topic, so any number of
+clients can follow a job without polling.
+"""
+import os
+import secrets
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.events import EventBus
+from api.models import RenderOptions
+from api.render_pool import RenderPool
+from api.renderer import RenderResult, TiledRenderer, source_megapixels
+
+
+TASK_QUEUED = "queued"
+TASK_RUNNING = "running"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+FINISHED_STATES = (TASK_DONE, TASK_FAILED)
+
+# Publish progress at most every 1% of a task's rows
+PROGRESS_STEP = 0.01
+
+
+class JobNotFoundError(KeyError):
+    """Job does not exist (or belongs to another user)."""
+
+
+def job_topic(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+@dataclass
+class RenderTask:
+    """One photo of a job."""
+    index: int
+    sha256: str
+    source_path: str
+    megapixels: float
+    state: str = TASK_QUEUED
+    progress: float = 0.0
+    width: Optional[int] = None
+    height: Optional[int] = None
+    error: Optional[str] = None
+    result_path: Optional[str] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "sha256": self.sha256,
+            "state": self.state,
+            "progress": round(self.progress, 3),
+            "megapixels": round(self.megapixels, 2),
+            "width": self.width,
+            "height": self.height,
+            "error": self.error,
+        }
+
+
+@dataclass
+class RenderJob:
+    """A batch of render tasks sharing the same options."""
+    id: str
+    user_id: str
+    options: RenderOptions
+    output_dir: str
+    tasks: List[RenderTask]
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def state(self) -> str:
+        if self.finished_at is not None:
+            return "completed"
+        return "running" if self.started_at is not None else "queued"
+
+    def stats(self) -> Dict[str, Any]:
+        """Aggregate progress, throughput in megapixels/s and ETA."""
+        counts = {state: 0 for state in (TASK_QUEUED, TASK_RUNNING, TASK_DONE, TASK_FAILED)}
+        megapixels_done = megapixels_total = 0.0
+        for task in self.tasks:
+            counts[task.state] += 1
+            megapixels_total += task.megapixels
+            megapixels_done += task.megapixels * (1.0 if task.state in FINISHED_STATES else task.progress)
+
+        elapsed = 0.0
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        throughput = megapixels_done / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.finished_at is None and throughput > 0:
+            eta = round((megapixels_total - megapixels_done) / throughput, 1)
+
+        return {
+            "total": len(self.tasks),
+            **counts,
+            "megapixels_done": round(megapixels_done, 2),
+            "megapixels_total": round(megapixels_total, 2),
+            "megapixels_per_second": round(throughput, 2),
+            "elapsed_seconds": round(elapsed, 1),
+            "eta_seconds": eta,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "created_at": self.created_at,
+            "tasks": [task.to_dict() for task in self.tasks],
+            "stats": self.stats(),
+        }
+
+
+class JobManager:
+    """Runs render jobs on the render pool and publishes their progress."""
+
+    def __init__(
+        self,
+        renderer: TiledRenderer,
+        pool: RenderPool,
+        bus: EventBus,
+        job_dir: str,
+        job_ttl: float = 3600
+    ):
+        self.renderer = renderer
+        self.pool = pool
+        self.bus = bus
+        self.job_dir = job_dir
+        self.job_ttl = job_ttl
+        self.jobs: Dict[str, RenderJob] = {}
+        self.lock = threading.Lock()
+
+        # Jobs do not survive a restart
+        shutil.rmtree(job_dir, ignore_errors=True)
+        os.makedirs(job_dir, exist_ok=True)
+
+    def create_job(
+        self,
+        user_id: str,
+        sources: List[Tuple[str, str]],
+        options: RenderOptions
+    ) -> RenderJob:
+        """
+        Queue a job for (sha256, path) sources.
+
+        Reads each image header for its size, so blocking; raises ValueError
+        for files that are not images.
+        """
+        tasks = []
+        for index, (sha256, path) in enumerate(sources):
+            try:
+                megapixels = source_megapixels(path)
+            except OSError:
+                raise ValueError(f"Upload {sha256} is not a supported image")
+            tasks.append(RenderTask(
+                index=index,
+                sha256=sha256,
+                source_path=path,
+                megapixels=megapixels,
+            ))
+
+        job_id = secrets.token_hex(16)
+        job = RenderJob(
+            id=job_id,
+            user_id=user_id,
+            options=options,
+            output_dir=os.path.join(self.job_dir, job_id),
+            tasks=tasks,
+            created_at=time.time(),
+        )
+        os.makedirs(job.output_dir)
+        with self.lock:
+            self.jobs[job_id] = job
+        for task in tasks:
+            self.pool.submit(self._run_task, job, task, megapixels=task.megapixels)
+        return job
+
+    def get_job(self, job_id: str, user_id: str) -> RenderJob:
+        """Get a job owned by user_id."""
+        job = self.jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            raise JobNotFoundError(job_id)
+        return job
+
+    def get_result_path(self, job: RenderJob, index: int) -> str:
+        """Get the rendered file of a finished task."""
+        if not 0 <= index < len(job.tasks) or job.tasks[index].state != TASK_DONE:
+            raise JobNotFoundError(f"{job.id}/{index}")
+        return job.tasks[index].result_path
+
+    def cleanup_expired(self) -> int:
+        """Remove finished jobs older than the TTL. Returns the number removed."""
+        now = time.time()
+        with self.lock:
+            expired = [
+                job for job in self.jobs.values()
+                if job.finished_at is not None and now - job.finished_at > self.job_ttl
+            ]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.output_dir, ignore_errors=True)
+        return len(expired)
+
+    # ==================== Workers ====================
+
+    def _run_task(self, job: RenderJob, task: RenderTask) -> Optional[RenderResult]:
+        topic = job_topic(job.id)
+        with job.lock:
+            if job.started_at is None:
+                job.started_at = time.time()
+        task.state = TASK_RUNNING
+        task.started_at = time.time()
+        self.bus.publish(topic, "task", task.to_dict(), key=f"task:{task.index}", droppable=False)
+
+        published = [0.0]
+
+        def on_progress(rows: int, total: int) -> None:
+            task.progress = rows / total
+            if task.progress - published[0] >= PROGRESS_STEP:
+                published[0] = task.progress
+                self.bus.publish(topic, "progress", {
+                    "index": task.index, "progress": round(task.progress, 3)
+                }, key=f"progress:{task.index}")
+                self.bus.publish(topic, "stats", job.stats(), key="stats")
+
+        output_path = os.path.join(job.output_dir, f"{task.index}.jpg")
+        result = None
+        try:
+            result = self.renderer.render(task.source_path, job.options, output_path, on_progress)
+            task.width, task.height = result.width, result.height
+            task.result_path = output_path
+            task.progress = 1.0
+            task.state = TASK_DONE
+        except Exception as e:
+            print(f"Render job {job.id} task {task.index} failed: {e}")
+            task.error = str(e)
+            task.state = TASK_FAILED
+        task.finished_at = time.time()
+
+        self.bus.publish(topic, "task", task.to_dict(), key=f"task:{task.index}", droppable=False)
+        with job.lock:
+            finished = all(t.state in FINISHED_STATES for t in job.tasks)
+            if finished and job.finished_at is None:
+                job.finished_at = time.time()
+            else:
+                finished = False
+        self.bus.publish(topic, "stats", job.stats(), key="stats")
+        if finished:
+            self.bus.publish(topic, "job", {"job_id": job.id, "state": job.state, "stats": job.stats()})
+        return result
@@ -0,0 +1,207 @@
+"""
+EXIF parsing and JPEG metadata re-muxing for server-side rendering.
+Formatting follows the frontend exifReader so borders look the same.
+"""
+import os
+import re
+import shutil
+import struct
+from typing import BinaryIO, List, Optional
+
+from PIL import Image
+
+from api.models import ExifData
+
+
+# EXIF tag IDs
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_ORIENTATION = 0x0112
+TAG_DATETIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_EXPOSURE_TIME = 0x829A
+TAG_F_NUMBER = 0x829D
+TAG_ISO = 0x8827
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_FOCAL_LENGTH = 0x920A
+TAG_LENS_MODEL = 0xA434
+
+# JPEG markers
+SOI = b"\xff\xd8"
+SOS = 0xDA
+EOI = 0xD9
+APP0 = 0xE0
+APP1 = 0xE1
+APP2 = 0xE2
+APP13 = 0xED
+
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+XMP_EXTENSION_HEADER = b"http://ns.adobe.com/xmp/extension/\x00"
+
+# XMP that describes auxiliary images stored after the primary image (HDR
+# gain maps, motion photo videos). Rendered files contain only the primary
+# image, so these properties would point at data that is not there.
+AUXILIARY_XMP_PROPERTY = rb"(?:hdrgm:\w+|GCamera:(?:MotionPhoto|MicroVideo)\w*)"
+AUXILIARY_XMP_PATTERNS = (
+    re.compile(rb"<Container:Directory\b.*?</Container:Directory>", re.DOTALL),
+    re.compile(rb"<(" + AUXILIARY_XMP_PROPERTY + rb")\b[^>]*?(?:/>|>.*?</\1>)", re.DOTALL),
+    re.compile(rb"\s" + AUXILIARY_XMP_PROPERTY + rb"=(?:\"[^\"]*\"|'[^']*')"),
+)
+
+
+def _format_number(value) -> str:
+    """Format a rational like JavaScript's Number#toString."""
+    num = float(value)
+    return str(int(num)) if num.is_integer() else f"{num:g}"
+
+
+def _format_date(value: str) -> str:
+    """Convert 'YYYY:MM:DD HH:MM:SS' to 'YYYY-MM-DD HH:MM:SS'."""
+    parts = value.split(" ")
+    if len(parts) == 2:
+        return f"{parts[0].replace(':', '-')} {parts[1]}"
+    return value
+
+
+def _format_exposure_time(value) -> str:
+    num = float(value)
+    if num >= 1:
+        return f"{_format_number(num)}s"
+    return f"1/{round(1 / num)}s"
+
+
+def parse_exif(image: Image.Image) -> Optional[ExifData]:
+    """Read the EXIF fields used in the border text. Returns None if absent."""
+    exif = image.getexif()
+    if not exif:
+        return None
+    ifd = exif.get_ifd(TAG_EXIF_IFD)
+
+    def text(value) -> Optional[str]:
+        if isinstance(value, bytes):
+            value = value.decode("utf-8", "ignore")
+        if isinstance(value, str):
+            value = value.strip("\x00 ").strip()
+            return value or None
+        return None
+
+    data = ExifData(
+        make=text(exif.get(TAG_MAKE)),
+        model=text(exif.get(TAG_MODEL)),
+        lens_model=text(ifd.get(TAG_LENS_MODEL)),
+    )
+
+    date_time = text(ifd.get(TAG_DATETIME_ORIGINAL)) or text(exif.get(TAG_DATETIME))
+    if date_time:
+        data.date_time = _format_date(date_time)
+
+    try:
+        if ifd.get(TAG_EXPOSURE_TIME):
+            data.exposure_time = _format_exposure_time(ifd[TAG_EXPOSURE_TIME])
+        if ifd.get(TAG_F_NUMBER):
+            data.f_number = f"f/{_format_number(ifd[TAG_F_NUMBER])}"
+        if ifd.get(TAG_FOCAL_LENGTH):
+            data.focal_length = f"{_format_number(ifd[TAG_FOCAL_LENGTH])}mm"
+        iso = ifd.get(TAG_ISO)
+        if isinstance(iso, tuple):
+            iso = iso[0] if iso else None
+        if iso:
+            data.iso = f"ISO {int(iso)}"
+    except (TypeError, ValueError, ZeroDivisionError) as e:
+        print(f"EXIF parse warning: {e}")
+
+    return data
+
+
+def get_orientation(image: Image.Image) -> int:
+    """Get EXIF orientation (1-8) without decoding pixel data; invalid values count as 1."""
+    orientation = image.getexif().get(TAG_ORIENTATION, 1)
+    return orientation if orientation in range(1, 9) else 1
+
+
+def exif_bytes_for_output(image: Image.Image) -> Optional[bytes]:
+    """Serialize the source EXIF with orientation reset, as pixels are already rotated."""
+    data = image.info.get("exif")
+    if not data:
+        return None
+    # Work on a copy so the source orientation is still applied on decode
+    exif = Image.Exif()
+    exif.load(data)
+    if TAG_ORIENTATION in exif:
+        exif[TAG_ORIENTATION] = 1
+    return exif.tobytes()
+
+
+def strip_auxiliary_xmp(packet: bytes) -> bytes:
+    """Remove gain map / motion photo properties and the container directory from XMP."""
+    for pattern in AUXILIARY_XMP_PATTERNS:
+        packet = pattern.sub(b"", packet)
+    return packet
+
+
+def read_metadata_segments(fp: BinaryIO) -> List[bytes]:
+    """
+    Read the APPn segments of a JPEG that the encoder does not write itself.
+
+    EXIF and ICC are passed to the encoder directly; this returns XMP (with
+    extended XMP) and IPTC segments. MPF is skipped because its offsets point
+    at auxiliary images (e.g. HDR gain maps) that the rendered file no
+    longer contains; XMP describing those images is stripped for the same
+    reason.
+    """
+    segments = []
+    if fp.read(2) != SOI:
+        return segments
+
+    while True:
+        header = fp.read(4)
+        if len(header) < 4 or header[0] != 0xFF:
+            break
+        marker = header[1]
+        if marker in (SOS, EOI):
+            break
+        length = struct.unpack(">H", header[2:])[0]
+        payload = fp.read(length - 2)
+
+        if marker == APP1 and payload.startswith(XMP_HEADER):
+            payload = XMP_HEADER + strip_auxiliary_xmp(payload[len(XMP_HEADER):])
+            segments.append(header[:2] + struct.pack(">H", len(payload) + 2) + payload)
+        elif marker == APP1 and payload.startswith(XMP_EXTENSION_HEADER):
+            segments.append(header + payload)
+        elif marker == APP13:
+            segments.append(header + payload)
+
+    return segments
+
+
+def remux_metadata(segments: List[bytes], output_path: str) -> int:
+    """
+    Insert XMP/IPTC segments read from the source into an encoded JPEG.
+
+    The output is rewritten through a sibling temp file so only the header is
+    held in memory. Returns the number of segments copied.
+    """
+    if not segments:
+        return 0
+
+    tmp_path = f"{output_path}.remux"
+    with open(output_path, "rb") as src, open(tmp_path, "wb") as dst:
+        if src.read(2) != SOI:
+            raise ValueError("Output is not a JPEG file")
+        dst.write(SOI)
+
+        # Keep the encoder's APP0 (JFIF) / APP1 (EXIF) / APP2 (ICC) first
+        while True:
+            header = src.read(4)
+            if len(header) < 4 or header[1] not in (APP0, APP1, APP2):
+                break
+            length = struct.unpack(">H", header[2:])[0]
+            dst.write(header + src.read(length - 2))
+
+        for segment in segments:
+            dst.write(segment)
+        dst.write(header)
+        shutil.copyfileobj(src, dst)
+
+    os.replace(tmp_path, output_path)
+    return len(segments)
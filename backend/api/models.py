@@ -1,8 +1,9 @@
 """
 Pydantic models for request and response validation.
 """
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, Dict, Any
+from pydantic import AfterValidator, BaseModel, EmailStr, Field, model_validator
+from pydantic.alias_generators import to_camel
+from typing import Annotated, Optional, Dict, Any, List, Literal
 
 
 # ==================== Request Models ====================
@@ -25,6 +26,139 @@ class SaveSettingsRequest(BaseModel):
     settings: Dict[str, Any] = Field(default_factory=dict, description="User settings")
 
 
+class CreateUploadRequest(BaseModel):
+    """Create upload session request model."""
+    filename: str = Field(..., min_length=1, max_length=255, description="Original file name")
+    size: int = Field(..., gt=0, description="Total size in bytes")
+    content_type: str = Field("application/octet-stream", description="MIME type")
+
+
+# ==================== Render Models ====================
+# Mirror the frontend types in src/types/image.ts so the same option objects
+# can be posted as-is (camelCase on the wire, snake_case in Python).
+
+class RenderModel(BaseModel):
+    """Base model for render options using camelCase aliases."""
+
+    class Config:
+        alias_generator = to_camel
+        populate_by_name = True
+
+
+class BorderStyle(RenderModel):
+    """Border style model."""
+    id: str = "default"
+    name: str = ""
+    type: Literal["bottom", "full", "artistic", "blur", "custom"] = "bottom"
+    bottom_height: Optional[float] = None
+    bottom_height_percent: Optional[float] = None
+    side_width: Optional[float] = None
+    side_width_percent: Optional[float] = None
+    top_width_percent: Optional[float] = None
+    left_width_percent: Optional[float] = None
+    right_width_percent: Optional[float] = None
+    padding: Optional[float] = None
+    background_color: Optional[str] = None
+    text_color: Optional[str] = None
+    font: Optional[str] = None
+    font_size: Optional[float] = None
+    show_exif: bool = False
+    show_logo: bool = False
+    logo_position: Optional[Literal["left", "center", "right"]] = None
+    blur: bool = False
+    shadow: bool = False
+
+
+class LogoConfig(RenderModel):
+    """Logo configuration model."""
+    id: str
+    name: str = ""
+    url: str = Field(..., description="Logo image as a data: URL")
+    position: Literal["top", "bottom"] = "bottom"
+    align: Literal["left", "center", "right"] = "center"
+    size: float = Field(10, description="Percentage of image width")
+    opacity: float = 1
+    show_logo: Optional[bool] = None
+    offset_x: Optional[float] = None
+    offset_y: Optional[float] = None
+
+
+class ExifData(RenderModel):
+    """EXIF fields used for the text block."""
+    make: Optional[str] = None
+    model: Optional[str] = None
+    date_time: Optional[str] = None
+    exposure_time: Optional[str] = None
+    f_number: Optional[str] = None
+    iso: Optional[str] = None
+    focal_length: Optional[str] = None
+    lens_model: Optional[str] = None
+
+
+class RenderOptions(RenderModel):
+    """Render options model (frontend ProcessOptions)."""
+    border_style: BorderStyle = Field(default_factory=BorderStyle)
+    logo_config: Optional[LogoConfig] = None
+    logo_configs: Optional[List[LogoConfig]] = None
+    exif_fields: List[str] = Field(default_factory=list)
+    exif: Optional[ExifData] = Field(None, description="Overrides EXIF read from the photo")
+    exif_text_align: Literal["left", "center", "right"] = "left"
+    exif_text_offset: float = 0
+    exif_text_offset_x: float = 0
+    exif_text_offset_y: float = 0
+    exif_font_family: str = "Arial"
+    exif_font_size: float = Field(1, description="Percentage of image width")
+    exif_text_color: str = "#333333"
+    output_width: Optional[int] = None
+    output_height: Optional[int] = None
+    maintain_aspect_ratio: bool = True
+    quality: int = Field(95, ge=1, le=100, description="JPEG quality (1-100)")
+
+
+class OutputSpec(RenderModel):
+    """One output rendition (SizeAdjuster size mode plus encoding)."""
+    name: Optional[str] = Field(None, pattern=r"^[A-Za-z0-9_-]{1,64}$")
+    size_mode: Literal["original", "ratio", "fixed", "max"] = "original"
+    scale_percent: float = Field(100, gt=0, le=100, description="Used by 'ratio'")
+    width: Optional[int] = Field(None, gt=0, description="Used by 'fixed'")
+    height: Optional[int] = Field(None, gt=0, description="Used by 'fixed'")
+    max_size: Optional[int] = Field(None, gt=0, description="Longest side for 'max'")
+    maintain_aspect_ratio: bool = True
+    quality: int = Field(95, ge=1, le=100)
+    format: Literal["jpeg", "png", "webp"] = "jpeg"
+
+    @model_validator(mode="after")
+    def check_size(self):
+        if self.size_mode == "fixed" and not (self.width or self.height):
+            raise ValueError("'fixed' size mode requires width or height")
+        if self.size_mode == "max" and not self.max_size:
+            raise ValueError("'max' size mode requires maxSize")
+        return self
+
+
+def name_output_specs(specs: List[OutputSpec]) -> List[OutputSpec]:
+    """Name unnamed renditions by position; names must be unique (they name the files)."""
+    seen = set()
+    for index, spec in enumerate(specs):
+        spec.name = spec.name or f"rendition_{index + 1}"
+        # Compare case-insensitively, as on Windows/macOS file systems
+        if spec.name.casefold() in seen:
+            raise ValueError(f"Duplicate output name '{spec.name}'")
+        seen.add(spec.name.casefold())
+    return specs
+
+
+OutputSpecList = Annotated[List[OutputSpec], AfterValidator(name_output_specs)]
+
+
+class CreateJobRequest(BaseModel):
+    """Create render job request model."""
+    sha256: List[str] = Field(
+        ..., min_length=1, max_length=500, description="Content hashes of finalized uploads"
+    )
+    options: RenderOptions = Field(default_factory=RenderOptions, description="Render options")
+
+
 # ==================== Response Models ====================
 
 class UserResponse(BaseModel):
@@ -52,6 +186,63 @@ class SettingsResponse(BaseModel):
     updated_at: Optional[str] = None
 
 
+class UploadSessionResponse(BaseModel):
+    """Upload session status response model."""
+    upload_id: str
+    filename: str
+    size: int
+    offset: int
+    expires_at: float
+
+
+class UploadCompleteResponse(BaseModel):
+    """Finalized upload response model."""
+    sha256: str
+    size: int
+    filename: str
+
+
+class JobTaskResponse(BaseModel):
+    """Render job task status model."""
+    index: int
+    sha256: str
+    state: Literal["queued", "running", "done", "failed"]
+    progress: float
+    megapixels: float
+    width: Optional[int] = None
+    height: Optional[int] = None
+    error: Optional[str] = None
+
+
+class JobStatsResponse(BaseModel):
+    """Aggregate render job progress model."""
+    total: int
+    queued: int
+    running: int
+    done: int
+    failed: int
+    megapixels_done: float
+    megapixels_total: float
+    megapixels_per_second: float
+    elapsed_seconds: float
+    eta_seconds: Optional[float] = None
+
+
+class JobResponse(BaseModel):
+    """Render job status response model."""
+    job_id: str
+    state: Literal["queued", "running", "completed"]
+    created_at: float
+    tasks: List[JobTaskResponse]
+    stats: JobStatsResponse
+
+
+class StreamTokenResponse(BaseModel):
+    """Job progress stream token response model."""
+    token: str
+    expires_in: int
+
+
 # ==================== Error Models ====================
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,411 @@
+"""
+Self-sizing worker pool for server-side renders.
+
+Workers are started up to the CPU count. A queued render is only admitted
+when its estimated memory fits in what the machine has left: the pool reads
+MemAvailable from /proc/meminfo and subtracts the part of the running
+renders' estimates they have not allocated yet (their estimates less the
+growth of the process's anonymous RSS since the pool was last idle), so a
+burst of admissions is not counted against memory it has yet to use. Each
+render is estimated from its source megapixels and the bytes per megapixel
+measured on renders that ran alone (peak anonymous RSS, polled during the
+run). File-backed pages such as the mapped spool raster are left out: they
+are reclaimable page cache, which MemAvailable already counts as available.
+Large renders (more than a quarter of the available memory) never run
+together.
+
+Scheduling packs renders instead of running them strictly first-in first-out:
+each free slot takes the largest queued render that still fits next to the
+running ones, so small photos fill the space left beside a large one. A
+render that has been passed over too often is run next, as soon as it fits.
+"""
+import ctypes
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+MB = 1024 * 1024
+
+# Starting estimate: decoded source plus an oriented/converted copy at
+# 4 bytes per pixel, refined from measured renders
+INITIAL_BYTES_PER_MEGAPIXEL = 10 * MB
+MIN_TASK_BYTES = 32 * MB
+EWMA_ALPHA = 0.2
+
+# Memory kept free for the rest of the process and the system
+DEFAULT_RESERVE_BYTES = 512 * MB
+# Used when /proc/meminfo is not available (non-Linux)
+FALLBACK_CAPACITY_BYTES = 2048 * MB
+MEMINFO_PATH = "/proc/meminfo"
+MEMINFO_MAX_AGE = 0.5  # seconds
+PROC_STATUS_PATH = "/proc/self/status"
+# How often anonymous RSS is sampled while a render runs alone
+MEMORY_SAMPLE_INTERVAL = 0.01  # seconds
+
+# Tasks above this fraction of the capacity are "large" and run one at a time
+LARGE_TASK_FRACTION = 0.25
+# Queued tasks considered for packing, and how often one may be passed over
+SCHEDULING_WINDOW = 32
+MAX_SKIPS = 8
+# Re-check available memory while waiting for admission
+ADMISSION_POLL_INTERVAL = 1.0
+RECENT_TASKS = 100
+
+try:
+    # glibc keeps freed heap memory; a render reusing it would not show up in RSS
+    _malloc_trim = ctypes.CDLL("libc.so.6").malloc_trim
+except (OSError, AttributeError):
+    _malloc_trim = None
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on (respects affinity/cpusets in containers)."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def read_mem_available() -> Optional[int]:
+    """MemAvailable from /proc/meminfo in bytes, or None if unavailable."""
+    try:
+        with open(MEMINFO_PATH, "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def read_process_memory(name: str = "RssAnon") -> Optional[int]:
+    """A memory field of /proc/self/status (e.g. RssAnon, VmHWM) in bytes, or None."""
+    prefix = f"{name}:"
+    try:
+        with open(PROC_STATUS_PATH, "r") as f:
+            for line in f:
+                if line.startswith(prefix):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def release_free_memory() -> None:
+    """Return memory freed by earlier renders to the OS (glibc only)."""
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+@dataclass
+class PoolTask:
+    """A queued or running render."""
+    fn: Callable[..., Any]
+    args: tuple
+    megapixels: float
+    estimate: int
+    future: Future
+    submitted_at: float
+    started_at: Optional[float] = None
+    large: bool = False
+    skipped: int = 0
+    # Set while no other render has run next to this one; its memory is then its own
+    alone: bool = False
+    rss_before: Optional[int] = None
+    rss_peak: Optional[int] = None
+
+
+@dataclass
+class TaskRecord:
+    """Resource usage of a finished render."""
+    megapixels: float
+    memory_bytes: Optional[int]  # measured peak; None unless the render ran alone
+    estimate: int
+    wait_seconds: float
+    run_seconds: float
+    failed: bool = False
+
+
+@dataclass
+class PoolStats:
+    """Running statistics used for estimates and reporting."""
+    bytes_per_megapixel: float = INITIAL_BYTES_PER_MEGAPIXEL
+    seconds_per_megapixel: Optional[float] = None
+    completed: int = 0
+    failed: int = 0
+    peak_running: int = 0
+    peak_committed_bytes: int = 0
+    recent: Deque[TaskRecord] = field(default_factory=lambda: deque(maxlen=RECENT_TASKS))
+
+
+class RenderPool:
+    """Memory-aware render worker pool."""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        memory_limit: Optional[int] = None,
+        reserve_bytes: int = DEFAULT_RESERVE_BYTES
+    ):
+        self.max_workers = max_workers or available_cpus()
+        self.memory_limit = memory_limit
+        self.reserve_bytes = reserve_bytes
+        self.stats = PoolStats()
+        self._queue: List[PoolTask] = []
+        self._running: List[PoolTask] = []
+        self._workers = 0
+        self._idle = 0
+        self._shutdown = False
+        self._cond = threading.Condition()
+        self._mem_available: Optional[int] = None
+        self._rss: Optional[int] = None
+        self._idle_rss: Optional[int] = None
+        self._mem_checked_at = 0.0
+
+    def submit(self, fn: Callable[..., Any], *args, megapixels: float) -> Future:
+        """Queue fn(*args) for a source of the given size."""
+        future: Future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Render pool is shut down")
+            self._queue.append(PoolTask(
+                fn=fn,
+                args=args,
+                megapixels=megapixels,
+                estimate=self.estimate(megapixels),
+                future=future,
+                submitted_at=time.time(),
+            ))
+            self._maybe_add_worker()
+            self._cond.notify()
+        return future
+
+    def estimate(self, megapixels: float) -> int:
+        """Estimated peak memory of a render from its source size."""
+        return max(MIN_TASK_BYTES, int(megapixels * self.stats.bytes_per_megapixel))
+
+    def capacity(self) -> int:
+        """
+        Memory available to renders: MemAvailable plus what running renders
+        have already allocated of their estimates, less the reserve.
+        """
+        now = time.monotonic()
+        if now - self._mem_checked_at > MEMINFO_MAX_AGE:
+            self._mem_available = read_mem_available()
+            self._rss = read_process_memory()
+            self._mem_checked_at = now
+
+        if self._mem_available is None:
+            capacity = FALLBACK_CAPACITY_BYTES
+        else:
+            # Only allocated memory is already missing from MemAvailable; the
+            # rest of the estimates is still to come
+            committed = sum(task.estimate for task in self._running)
+            capacity = self._mem_available + min(committed, self.allocated()) - self.reserve_bytes
+        if self.memory_limit:
+            capacity = min(capacity, self.memory_limit)
+        return max(0, capacity)
+
+    def allocated(self) -> int:
+        """Anonymous RSS growth since the pool was last idle: what running renders use so far."""
+        if self._rss is None or self._idle_rss is None or not self._running:
+            return 0
+        return max(0, self._rss - self._idle_rss)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current load and per-task statistics."""
+        with self._cond:
+            recent = list(self.stats.recent)
+            capacity = self.capacity()
+            committed = sum(task.estimate for task in self._running)
+            return {
+                "max_workers": self.max_workers,
+                "workers": self._workers,
+                "running": len(self._running),
+                "queued": len(self._queue),
+                "large_running": sum(1 for task in self._running if task.large),
+                "capacity_bytes": capacity,
+                "committed_bytes": committed,
+                "allocated_bytes": self.allocated(),
+                "bytes_per_megapixel": int(self.stats.bytes_per_megapixel),
+                "seconds_per_megapixel": (
+                    round(self.stats.seconds_per_megapixel, 4)
+                    if self.stats.seconds_per_megapixel is not None else None
+                ),
+                "completed": self.stats.completed,
+                "failed": self.stats.failed,
+                "peak_running": self.stats.peak_running,
+                "peak_committed_bytes": self.stats.peak_committed_bytes,
+                "recent_max_memory_bytes": max((r.memory_bytes or 0 for r in recent), default=0),
+                "recent_mean_wait_seconds": (
+                    round(sum(r.wait_seconds for r in recent) / len(recent), 3) if recent else 0.0
+                ),
+            }
+
+    def shutdown(self, cancel_queued: bool = True) -> None:
+        """Stop accepting work; optionally cancel renders that have not started."""
+        with self._cond:
+            self._shutdown = True
+            if cancel_queued:
+                for task in self._queue:
+                    task.future.cancel()
+                self._queue.clear()
+            self._cond.notify_all()
+
+    # ==================== Scheduling ====================
+
+    def _next_task(self) -> Optional[PoolTask]:
+        """Pick the next admissible task. Called with the condition held."""
+        if not self._queue or len(self._running) >= self.max_workers:
+            return None
+
+        capacity = self.capacity()
+        headroom = capacity - sum(task.estimate for task in self._running)
+        large_running = any(task.large for task in self._running)
+
+        def fits(task: PoolTask) -> bool:
+            # Re-estimate with the latest measurements
+            task.estimate = self.estimate(task.megapixels)
+            task.large = task.estimate > capacity * LARGE_TASK_FRACTION
+            if not self._running:
+                # Always make progress, even if a single task exceeds the estimate
+                return True
+            return task.estimate <= headroom and not (task.large and large_running)
+
+        window = self._queue[:SCHEDULING_WINDOW]
+        # A task passed over too often is next; hold the slot until it fits
+        for task in window:
+            if task.skipped >= MAX_SKIPS:
+                return task if fits(task) else None
+
+        candidates = [task for task in window if fits(task)]
+        if not candidates:
+            return None
+        chosen = max(candidates, key=lambda task: task.estimate)
+        for task in window:
+            if task is chosen:
+                break
+            task.skipped += 1
+        return chosen
+
+    def _maybe_add_worker(self) -> None:
+        """Start a worker if tasks are queued and all workers are busy."""
+        if self._queue and self._idle == 0 and self._workers < self.max_workers:
+            self._workers += 1
+            threading.Thread(target=self._worker, name="render-pool", daemon=True).start()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                self._idle += 1
+                task = self._next_task()
+                while task is None:
+                    if self._shutdown and not self._queue:
+                        self._idle -= 1
+                        self._workers -= 1
+                        return
+                    self._cond.wait(ADMISSION_POLL_INTERVAL)
+                    task = self._next_task()
+                self._idle -= 1
+                self._queue.remove(task)
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                task.started_at = time.time()
+                self._start_measuring(task)
+                self._running.append(task)
+                self._record_load()
+                # Grow with the queue: more work waiting and nobody free to admit it
+                self._maybe_add_worker()
+
+            self._run(task)
+
+            with self._cond:
+                self._running.remove(task)
+                self._cond.notify_all()
+
+    def _run(self, task: PoolTask) -> None:
+        sampler = None
+        if task.alone:
+            done = threading.Event()
+            sampler = threading.Thread(
+                target=self._sample_memory, args=(task, done), name="render-pool-sampler", daemon=True
+            )
+            sampler.start()
+        try:
+            result = task.fn(*task.args)
+        except BaseException as e:
+            if sampler is not None:
+                done.set()
+                sampler.join()
+            self._record(task, None, failed=True)
+            task.future.set_exception(e)
+            return
+        if sampler is not None:
+            done.set()
+            sampler.join()
+        self._record(task, self._measured_memory(task))
+        task.future.set_result(result)
+
+    # ==================== Statistics ====================
+
+    def _start_measuring(self, task: PoolTask) -> None:
+        """Take the idle RSS baseline; a render that starts alone is sampled."""
+        if self._running:
+            for running in self._running:
+                running.alone = False
+            return
+        release_free_memory()
+        rss = read_process_memory()
+        self._rss = self._idle_rss = task.rss_before = task.rss_peak = rss
+        task.alone = rss is not None
+
+    def _sample_memory(self, task: PoolTask, done: threading.Event) -> None:
+        """Track the peak anonymous RSS while a render runs, until `done` is set."""
+        while not done.wait(MEMORY_SAMPLE_INTERVAL):
+            rss = read_process_memory()
+            if rss is not None:
+                task.rss_peak = max(task.rss_peak or 0, rss)
+
+    def _measured_memory(self, task: PoolTask) -> Optional[int]:
+        """Peak anonymous RSS growth of a render that ran alone; None otherwise."""
+        with self._cond:
+            if not task.alone or task.rss_peak is None or task.rss_before is None:
+                return None
+            return max(0, task.rss_peak - task.rss_before)
+
+    def _record_load(self) -> None:
+        stats = self.stats
+        stats.peak_running = max(stats.peak_running, len(self._running))
+        committed = sum(task.estimate for task in self._running)
+        stats.peak_committed_bytes = max(stats.peak_committed_bytes, committed)
+
+    def _record(self, task: PoolTask, memory_bytes: Optional[int], failed: bool = False) -> None:
+        finished_at = time.time()
+        run_seconds = finished_at - task.started_at
+        with self._cond:
+            stats = self.stats
+            if failed:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+            if memory_bytes and task.megapixels > 0:
+                measured = memory_bytes / task.megapixels
+                stats.bytes_per_megapixel += EWMA_ALPHA * (measured - stats.bytes_per_megapixel)
+            if not failed and task.megapixels > 0:
+                measured = run_seconds / task.megapixels
+                if stats.seconds_per_megapixel is None:
+                    stats.seconds_per_megapixel = measured
+                else:
+                    stats.seconds_per_megapixel += EWMA_ALPHA * (measured - stats.seconds_per_megapixel)
+            stats.recent.append(TaskRecord(
+                megapixels=task.megapixels,
+                memory_bytes=memory_bytes,
+                estimate=task.estimate,
+                wait_seconds=task.started_at - task.submitted_at,
+                run_seconds=run_seconds,
+                failed=failed,
+            ))
@@ -0,0 +1,1068 @@
+"""
+Server-side border rendering with Pillow.
+
+Port of the frontend CanvasRenderer (src/utils/canvasRenderer.ts). Instead
+of allocating the whole output canvas, the output is composited in
+horizontal strips: background, shadow, photo region, text and logos are
+drawn per strip and streamed to a disk-backed raster that the JPEG encoder
+reads sequentially. The decoded source is kept as stored: EXIF orientation
+and colour conversion are applied to the rows each strip needs, so the only
+full-size allocation is the decode itself (reduced by JPEG DCT scaling when
+the output is smaller). That decode counts against the memory budget, and
+sources that do not fit next to a minimal strip are rejected.
+
+Several renditions (web, social, full size) can be produced from one decode
+and one composited border image; each rendition is resampled strip by strip
+from the nearest larger one.
+"""
+import base64
+import math
+import mmap
+import os
+import tempfile
+from io import BytesIO
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import BinaryIO, Callable, ContextManager, Iterator, List, Optional, Tuple, Union
+
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageFilter, ImageFont
+
+from api.metadata import (
+    exif_bytes_for_output,
+    get_orientation,
+    parse_exif,
+    read_metadata_segments,
+    remux_metadata
+)
+from api.models import BorderStyle, ExifData, LogoConfig, OutputSpec, RenderOptions
+
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024  # 512 MB
+# Per-pixel cost of one strip: strip canvas, scaled background, photo rows
+# and shadow mask (Pillow stores RGB as 4 bytes per pixel)
+STRIP_BYTES_PER_PIXEL = 16
+MIN_STRIP_HEIGHT = 16
+# Source modes that are cropped, oriented and converted strip by strip;
+# others (palette, bilevel, 16-bit) are converted once after decoding
+STRIP_DECODE_MODES = ("RGB", "RGBA", "L", "LA", "CMYK")
+# Copies of the source rows made per strip: crop, transpose, convert
+STRIP_SOURCE_COPIES = 3
+# Source rows cropped beyond a strip for the LANCZOS filter support
+RESAMPLE_MARGIN = 3
+# Spooled raster layout read back by the encoder without copying
+SPOOL_MODE = "RGBX"
+# Memory an encoder holds beyond the mapped raster, per output pixel: JPEG
+# streams rows from the mapping, PNG needs an RGB copy, and Pillow's WebP
+# encoder copies the pixels and libwebp builds its own pictures (measured
+# with Pillow 10.4)
+ENCODE_BYTES_PER_PIXEL = {"jpeg": 0, "png": 4, "webp": 28}
+
+# Blur background, matches the canvas 'blur(20px)' filter and 0.7 overlay
+BLUR_RADIUS = 20
+BLUR_OVERLAY_ALPHA = 0.7
+# Blurred background and shadow are smooth, so they are rendered at reduced
+# resolution once and upscaled per strip
+EFFECT_MAX_DIMENSION = 1024
+SHADOW_LAYERS = 10
+# Working images alive while an effect layer is built
+EFFECT_COPIES = 4
+# Logos are small; larger (or decompression-bomb) logos are skipped. A logo
+# is held decoded and as RGBA while it is resized
+MAX_LOGO_PIXELS = 2048 * 2048
+LOGO_COPIES = 2
+
+FALLBACK_FONTS = ["DejaVuSans.ttf", "Arial.ttf", "arial.ttf"]
+TEXT_ANCHORS = {"left": "la", "center": "ma", "right": "ra"}
+
+# EXIF orientations that rotate by 90 degrees
+ORIENTATION_SWAPS_AXES = {5, 6, 7, 8}
+# Transpose that displays a stored image with the given EXIF orientation
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Output format -> (Pillow format, file extension, media type)
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+    "png": ("PNG", "png", "image/png"),
+    "webp": ("WEBP", "webp", "image/webp"),
+}
+
+# Called with (rows done, total rows) as strips are composited
+ProgressCallback = Callable[[int, int], None]
+# Called with a stage name; the returned context manager wraps that stage.
+# Stages: decode, exif, background, shadow, resize, text, logo, spool, encode,
+# remux. Per-strip work is entered once per strip.
+StageHook = Callable[[str], ContextManager]
+_NO_STAGE = nullcontext()
+
+
+class RenderBudgetError(ValueError):
+    """The source cannot be rendered within the memory budget."""
+
+
+@dataclass
+class Layout:
+    """Output geometry in canvas pixels."""
+    width: int
+    height: int
+    image_x: int
+    image_y: int
+    image_width: int
+    image_height: int
+    left_width: float
+    right_width: float
+    top_width: float
+    bottom_height: float
+    original_width: int
+    original_height: int
+
+
+@dataclass
+class TextLine:
+    """A positioned line of EXIF text."""
+    text: str
+    x: float
+    y: float
+    anchor: str
+
+
+@dataclass
+class SpooledRaster:
+    """A disk-backed RGBX raster written strip by strip."""
+    path: str
+    width: int
+    height: int
+    strip_height: int
+    strip_count: int
+
+    @contextmanager
+    def open_image(self) -> Iterator[Image.Image]:
+        """Map the raster as a read-only image without copying it into memory."""
+        with open(self.path, "rb") as raster:
+            # Copy-on-write: pages stay file-backed unless something writes to them
+            mapping = mmap.mmap(raster.fileno(), 0, access=mmap.ACCESS_COPY)
+            try:
+                if hasattr(mapping, "madvise"):
+                    mapping.madvise(mmap.MADV_SEQUENTIAL)
+                image = Image.frombuffer(
+                    SPOOL_MODE, (self.width, self.height), mapping, "raw", SPOOL_MODE, 0, 1
+                )
+                # Image.save() copies read-only images in full before encoding;
+                # writes to this mapping never reach the file, so allow them
+                image.readonly = 0
+                try:
+                    yield image
+                finally:
+                    # Release the buffer export before closing the mapping
+                    image.close()
+            finally:
+                mapping.close()
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+@dataclass
+class Composite:
+    """A composited border image plus the metadata to write into outputs."""
+    raster: SpooledRaster
+    layout: Layout
+    exif_bytes: Optional[bytes] = None
+    icc_profile: Optional[bytes] = None
+    metadata_segments: List[bytes] = field(default_factory=list)
+    # Planned peak bytes: compositing (decoded source, effects, one strip)
+    # or encoding the largest rendition, whichever is larger
+    memory_bytes: int = 0
+
+    def close(self) -> None:
+        self.raster.remove()
+
+
+@dataclass
+class RenderResult:
+    """Result of a render."""
+    path: str
+    width: int
+    height: int
+    strip_height: int
+    strip_count: int
+    name: Optional[str] = None
+    format: str = "jpeg"
+    # Planned peak bytes (see Composite.memory_bytes)
+    memory_bytes: int = 0
+
+
+@dataclass
+class _RenderContext:
+    """Per-render state shared by all strips."""
+    layout: Layout
+    # Decoded source as stored; orientation and photo_mode are applied per strip
+    photo: Image.Image
+    background_color: Tuple[int, int, int]
+    orientation: int = 1
+    photo_mode: str = "RGB"
+    background: Optional[Image.Image] = None
+    shadow: Optional[Image.Image] = None
+    text_lines: List[TextLine] = field(default_factory=list)
+    text_font: Optional[ImageFont.ImageFont] = None
+    text_color: Tuple[int, int, int] = (51, 51, 51)
+    line_height: float = 0
+    logos: List[Tuple[Image.Image, int, int]] = field(default_factory=list)
+
+
+# ==================== Geometry ====================
+
+def get_border_dimensions(
+    original_width: float,
+    original_height: float,
+    border_style: BorderStyle
+) -> Tuple[float, float, float, float]:
+    """Get (left, right, top, bottom) border sizes, from percentages if set."""
+    def side(percent: Optional[float], base: float) -> float:
+        if percent is not None and percent > 0:
+            return base * percent / 100
+        if border_style.side_width_percent is not None:
+            return base * border_style.side_width_percent / 100
+        return border_style.side_width or 0
+
+    left = side(border_style.left_width_percent, original_width)
+    right = side(border_style.right_width_percent, original_width)
+    top = side(border_style.top_width_percent, original_height)
+    if border_style.bottom_height_percent is not None:
+        bottom = original_height * border_style.bottom_height_percent / 100
+    else:
+        bottom = border_style.bottom_height or 0
+    return left, right, top, bottom
+
+
+def calculate_dimensions(
+    original_width: int,
+    original_height: int,
+    options: RenderOptions
+) -> Tuple[float, float, int, int]:
+    """Calculate (width, height, image_width, image_height) of the output."""
+    left, right, top, bottom = get_border_dimensions(
+        original_width, original_height, options.border_style
+    )
+    output_width = options.output_width
+    output_height = options.output_height
+
+    image_width: float = original_width
+    image_height: float = original_height
+
+    if output_width and output_height:
+        if options.maintain_aspect_ratio:
+            aspect_ratio = original_width / original_height
+            if aspect_ratio > output_width / output_height:
+                image_width = output_width - left - right
+                image_height = image_width / aspect_ratio
+            else:
+                image_height = output_height - top - bottom
+                image_width = image_height * aspect_ratio
+        else:
+            image_width = output_width - left - right
+            image_height = output_height - top - bottom
+    elif output_width:
+        scale = output_width / (original_width + left + right)
+        image_width = original_width * scale
+        image_height = original_height * scale
+    elif output_height:
+        scale = output_height / (original_height + top + bottom)
+        image_width = original_width * scale
+        image_height = original_height * scale
+
+    image_width = round(image_width)
+    image_height = round(image_height)
+    return image_width + left + right, image_height + top + bottom, image_width, image_height
+
+
+def compute_layout(original_width: int, original_height: int, options: RenderOptions) -> Layout:
+    """Compute the full output layout for an oriented source size."""
+    width, height, image_width, image_height = calculate_dimensions(
+        original_width, original_height, options
+    )
+    left, right, top, bottom = get_border_dimensions(
+        original_width, original_height, options.border_style
+    )
+    if image_width <= 0 or image_height <= 0:
+        raise ValueError("Output size is too small for the selected border")
+    return Layout(
+        width=int(width),
+        height=int(height),
+        image_x=round(left),
+        image_y=round(top),
+        image_width=image_width,
+        image_height=image_height,
+        left_width=left,
+        right_width=right,
+        top_width=top,
+        bottom_height=bottom,
+        original_width=original_width,
+        original_height=original_height,
+    )
+
+
+def image_bytes(image: Image.Image) -> int:
+    """Approximate memory held by a decoded image (Pillow pads RGB to 4 bytes)."""
+    bytes_per_pixel = 1 if image.mode in ("1", "L", "P") else 4
+    return image.width * image.height * bytes_per_pixel
+
+
+def oriented_size(size: Tuple[int, int], orientation: int) -> Tuple[int, int]:
+    """Displayed size of a stored image with the given EXIF orientation."""
+    width, height = size
+    return (height, width) if orientation in ORIENTATION_SWAPS_AXES else (width, height)
+
+
+def source_box(
+    box: Tuple[float, float, float, float],
+    size: Tuple[int, int],
+    orientation: int
+) -> Tuple[float, float, float, float]:
+    """Map a box in displayed (oriented) coordinates to stored pixel coordinates."""
+    x0, y0, x1, y1 = box
+    width, height = size
+    return {
+        1: (x0, y0, x1, y1),
+        2: (width - x1, y0, width - x0, y1),
+        3: (width - x1, height - y1, width - x0, height - y0),
+        4: (x0, height - y1, x1, height - y0),
+        5: (y0, x0, y1, x1),
+        6: (y0, height - x1, y1, height - x0),
+        7: (width - y1, height - x1, width - y0, height - x0),
+        8: (width - y1, x0, width - y0, x1),
+    }[orientation]
+
+
+def photo_mode(image: Image.Image) -> str:
+    """Mode the photo is composited in."""
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    return "RGBA" if has_alpha else "RGB"
+
+
+def source_megapixels(source: Union[str, BinaryIO]) -> float:
+    """Read the pixel count of a source image from its header, in megapixels."""
+    if isinstance(source, str):
+        with Image.open(source) as image:
+            return image.width * image.height / 1e6
+
+    position = source.tell()
+    try:
+        with Image.open(source) as image:
+            return image.width * image.height / 1e6
+    finally:
+        source.seek(position)
+
+
+def strip_height_for_budget(row_bytes: int, memory_budget: int) -> int:
+    """Number of rows per strip whose working set fits in the memory budget."""
+    rows = memory_budget // max(1, row_bytes)
+    return max(MIN_STRIP_HEIGHT, int(rows))
+
+
+def rendition_size(spec: OutputSpec, width: int, height: int) -> Tuple[int, int]:
+    """
+    Target size of a rendition of a width x height composite, following the
+    SizeAdjuster modes: keep original, scale by ratio, fixed size, max dimension.
+    """
+    if spec.size_mode == "ratio":
+        scale = spec.scale_percent / 100
+    elif spec.size_mode == "max":
+        scale = min(1.0, spec.max_size / max(width, height))
+    elif spec.size_mode == "fixed":
+        if spec.width and spec.height and not spec.maintain_aspect_ratio:
+            return spec.width, spec.height
+        scales = []
+        if spec.width:
+            scales.append(spec.width / width)
+        if spec.height:
+            scales.append(spec.height / height)
+        scale = min(scales)
+    else:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+# ==================== Helpers ====================
+
+def parse_color(value: Optional[str], default: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    """Parse a CSS color string to RGB, falling back to a default."""
+    if not value:
+        return default
+    try:
+        return ImageColor.getrgb(value)[:3]
+    except ValueError:
+        return default
+
+
+@lru_cache(maxsize=32)
+def load_font(family: str, size: int) -> ImageFont.ImageFont:
+    """Load a TrueType font by family name with fallbacks."""
+    for candidate in [family, f"{family}.ttf", *FALLBACK_FONTS]:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size)
+
+
+def build_exif_lines(exif: ExifData, fields: List[str]) -> List[str]:
+    """
+    Build EXIF text lines:
+    Line 1: Brand Model
+    Line 2: ISO Aperture Shutter Focal
+    Line 3: DateTime
+    Line 4: Lens Model
+    """
+    lines = []
+
+    if "make" in fields or "model" in fields:
+        make = exif.make if "make" in fields else ""
+        model = exif.model if "model" in fields else ""
+        if make or model:
+            lines.append(f"{make or ''} {model or ''}".strip())
+
+    exposure_parts = [
+        value for name, value in (
+            ("iso", exif.iso),
+            ("fNumber", exif.f_number),
+            ("exposureTime", exif.exposure_time),
+            ("focalLength", exif.focal_length),
+        )
+        if name in fields and value
+    ]
+    if exposure_parts:
+        lines.append(" ".join(exposure_parts))
+
+    if "dateTime" in fields and exif.date_time:
+        lines.append(exif.date_time)
+
+    if "lensModel" in fields and exif.lens_model:
+        lines.append(exif.lens_model)
+
+    return lines
+
+
+def open_logo_image(url: str) -> Optional[Image.Image]:
+    """
+    Open a logo from a data: URL (header only). Other URLs cannot be resolved
+    server-side.
+    """
+    if not url.startswith("data:") or "," not in url:
+        print(f"Skipping logo with unsupported URL: {url[:64]}")
+        return None
+    header, payload = url.split(",", 1)
+    if not header.endswith(";base64"):
+        print("Skipping logo: only base64 data URLs are supported")
+        return None
+    try:
+        logo = Image.open(BytesIO(base64.b64decode(payload)))
+    except Exception as e:
+        print(f"Failed to load logo: {e}")
+        return None
+    if logo.width * logo.height > MAX_LOGO_PIXELS:
+        print(f"Skipping logo: {logo.width}x{logo.height} is larger than {MAX_LOGO_PIXELS} pixels")
+        return None
+    return logo
+
+
+# ==================== Renderer ====================
+
+class TiledRenderer:
+    """Pillow renderer that composites the output in memory-bounded strips."""
+
+    def __init__(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        spool_dir: Optional[str] = None,
+        stage_hook: Optional[StageHook] = None
+    ):
+        self.memory_budget = memory_budget
+        self.spool_dir = spool_dir or tempfile.gettempdir()
+        self.stage_hook = stage_hook
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+    def _stage(self, name: str) -> ContextManager:
+        """Wrap a pipeline stage for the optional timing hook."""
+        return self.stage_hook(name) if self.stage_hook else _NO_STAGE
+
+    def render(
+        self,
+        source: Union[str, BinaryIO],
+        options: RenderOptions,
+        output_path: str,
+        progress: Optional[ProgressCallback] = None
+    ) -> RenderResult:
+        """
+        Render a bordered JPEG from a source image file to output_path.
+
+        `progress` is called with (rows done, total rows) after each strip.
+        """
+        composite = self.composite(source, options, progress)
+        try:
+            self.encode(composite, composite.raster, output_path, "jpeg", options.quality)
+        finally:
+            composite.close()
+
+        return RenderResult(
+            path=output_path,
+            width=composite.layout.width,
+            height=composite.layout.height,
+            strip_height=composite.raster.strip_height,
+            strip_count=composite.raster.strip_count,
+            memory_bytes=composite.memory_bytes,
+        )
+
+    def render_renditions(
+        self,
+        source: Union[str, BinaryIO],
+        options: RenderOptions,
+        outputs: List[OutputSpec],
+        output_dir: str
+    ) -> List[RenderResult]:
+        """
+        Render several output renditions from one decode and one composite.
+
+        Renditions are produced largest first; each one is resampled from the
+        smallest already-rendered raster that is at least as large, so the
+        full-size composite is only read for the largest outputs. Results are
+        returned in the order of `outputs`.
+        """
+        composite = self.composite(source, options, outputs=outputs)
+        rasters: List[SpooledRaster] = []
+        results: List[Optional[RenderResult]] = [None] * len(outputs)
+        try:
+            full = composite.raster
+            targets = [rendition_size(spec, full.width, full.height) for spec in outputs]
+            order = sorted(range(len(outputs)), key=lambda i: targets[i][0] * targets[i][1], reverse=True)
+
+            for index in order:
+                spec = outputs[index]
+                width, height = targets[index]
+                if (width, height) == (full.width, full.height):
+                    raster = full
+                else:
+                    parent = min(
+                        (r for r in [full, *rasters] if r.width >= width and r.height >= height),
+                        key=lambda r: r.width * r.height,
+                        default=full,
+                    )
+                    raster = self._resample(parent, width, height)
+                    rasters.append(raster)
+
+                extension = OUTPUT_FORMATS[spec.format][1]
+                name = spec.name or f"rendition_{index + 1}"
+                path = os.path.join(output_dir, f"{name}_{width}x{height}.{extension}")
+                self.encode(composite, raster, path, spec.format, spec.quality)
+                results[index] = RenderResult(
+                    path=path,
+                    width=width,
+                    height=height,
+                    strip_height=raster.strip_height,
+                    strip_count=raster.strip_count,
+                    name=name,
+                    format=spec.format,
+                    memory_bytes=composite.memory_bytes,
+                )
+        finally:
+            for raster in rasters:
+                raster.remove()
+            composite.close()
+
+        return results
+
+    def composite(
+        self,
+        source: Union[str, BinaryIO],
+        options: RenderOptions,
+        progress: Optional[ProgressCallback] = None,
+        outputs: Optional[List[OutputSpec]] = None
+    ) -> Composite:
+        """
+        Decode the source and composite the bordered image into a spooled raster.
+
+        `outputs` are the renditions that will be encoded from it (a full-size
+        JPEG if omitted); their encoder memory is checked against the budget
+        before anything is decoded.
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                return self.composite(f, options, progress, outputs)
+
+        with self._stage("decode"):
+            image = Image.open(source)
+            layout = self._prepare_layout(image, options)
+        with self._stage("exif"):
+            exif = options.exif or parse_exif(image)
+            exif_bytes = exif_bytes_for_output(image)
+            icc_profile = image.info.get("icc_profile")
+        with self._stage("decode"):
+            orientation = get_orientation(image)
+            self._draft(image, layout, orientation)
+            logos = self._open_logos(options)
+            fixed_bytes, row_bytes = self._plan_memory(image, layout, options, orientation, logos)
+            encode_bytes = self._plan_encode(layout, outputs or [])
+            photo = self._decode(image)
+            # Some decoders (TIFF) apply the orientation while loading
+            orientation = get_orientation(photo)
+
+        ctx = self._build_context(photo, layout, options, exif, orientation, logos)
+        strip_height = strip_height_for_budget(row_bytes, self.memory_budget - fixed_bytes)
+        raster = self._spool(
+            layout.width, layout.height, lambda y0, y1: self._render_strip(ctx, y0, y1),
+            strip_height, progress
+        )
+        # Encoding starts once the composite's memory is released
+        memory_bytes = max(fixed_bytes + raster.strip_height * row_bytes, encode_bytes)
+        # Drop the decoded source as soon as the composite is on disk
+        del ctx, photo, image, logos
+
+        with self._stage("exif"):
+            source.seek(0)
+            metadata_segments = read_metadata_segments(source)
+        return Composite(
+            raster=raster,
+            layout=layout,
+            exif_bytes=exif_bytes,
+            icc_profile=icc_profile,
+            metadata_segments=metadata_segments,
+            memory_bytes=memory_bytes,
+        )
+
+    # ---------- Decode ----------
+
+    def _prepare_layout(self, image: Image.Image, options: RenderOptions) -> Layout:
+        """Compute the layout from the header only (no pixel decode)."""
+        width, height = image.size
+        if get_orientation(image) in ORIENTATION_SWAPS_AXES:
+            width, height = height, width
+        return compute_layout(width, height, options)
+
+    def _draft(self, image: Image.Image, layout: Layout, orientation: int) -> None:
+        """Let JPEG DCT scaling skip resolution the output does not need."""
+        # MPO is a JPEG primary image plus MPF auxiliary images (e.g. HDR gain maps)
+        if image.format in ("JPEG", "MPO") and layout.image_width < layout.original_width:
+            image.draft("RGB", oriented_size((layout.image_width, layout.image_height), orientation))
+
+    def _plan_memory(
+        self,
+        image: Image.Image,
+        layout: Layout,
+        options: RenderOptions,
+        orientation: int,
+        logos: List[Tuple[LogoConfig, Image.Image]]
+    ) -> Tuple[int, int]:
+        """
+        Plan memory from the (drafted) header: returns bytes held for the whole
+        composite (decoded source, effect layers, logos) and bytes per strip row.
+        Raises RenderBudgetError if a minimal strip does not fit beside them.
+        """
+        fixed_bytes = image_bytes(image)
+        if image.mode not in STRIP_DECODE_MODES:
+            fixed_bytes += image.width * image.height * 4
+
+        effect_pixels = round(layout.width * self._effect_scale(layout)) * round(
+            layout.height * self._effect_scale(layout)
+        )
+        if options.border_style.blur:
+            fixed_bytes += effect_pixels * 4 * EFFECT_COPIES
+        if options.border_style.shadow:
+            fixed_bytes += effect_pixels * EFFECT_COPIES
+        for logo_config, logo in logos:
+            logo_width, logo_height = self._logo_size(logo_config, logo, layout)
+            fixed_bytes += logo.width * logo.height * 4 * LOGO_COPIES + logo_width * logo_height * 4
+
+        row_bytes = layout.width * STRIP_BYTES_PER_PIXEL
+        if orientation != 1 or image.mode not in ("RGB", "RGBA"):
+            # Source rows are copied per strip to orient and convert them
+            width, height = oriented_size(image.size, orientation)
+            source_rows = height / layout.image_height
+            source_row_bytes = width * 4 * STRIP_SOURCE_COPIES
+            row_bytes += math.ceil(source_rows * source_row_bytes)
+            fixed_bytes += 2 * math.ceil(RESAMPLE_MARGIN * max(1.0, source_rows)) * source_row_bytes
+
+        needed = fixed_bytes + MIN_STRIP_HEIGHT * row_bytes
+        if needed > self.memory_budget:
+            raise RenderBudgetError(
+                f"Image needs {math.ceil(needed / 1024 / 1024)} MB to render, more than the "
+                f"{self.memory_budget // 1024 // 1024} MB render memory budget"
+            )
+        return fixed_bytes, row_bytes
+
+    def _plan_encode(self, layout: Layout, outputs: List[OutputSpec]) -> int:
+        """
+        Plan the largest encoder memory of the renditions (renditions are
+        encoded one at a time). Raises RenderBudgetError if one does not fit.
+        """
+        planned = 0
+        for spec in outputs:
+            width, height = rendition_size(spec, layout.width, layout.height)
+            needed = width * height * ENCODE_BYTES_PER_PIXEL[spec.format]
+            if needed > self.memory_budget:
+                raise RenderBudgetError(
+                    f"A {width}x{height} {spec.format.upper()} rendition needs "
+                    f"{math.ceil(needed / 1024 / 1024)} MB to encode, more than the "
+                    f"{self.memory_budget // 1024 // 1024} MB render memory budget"
+                )
+            planned = max(planned, needed)
+        return planned
+
+    def _decode(self, image: Image.Image) -> Image.Image:
+        """Decode the source as stored; orientation is applied per strip."""
+        image.load()
+        if image.mode not in STRIP_DECODE_MODES:
+            return image.convert(photo_mode(image))
+        return image
+
+    # ---------- Shared effects ----------
+
+    def _build_context(
+        self,
+        photo: Image.Image,
+        layout: Layout,
+        options: RenderOptions,
+        exif: Optional[ExifData],
+        orientation: int = 1,
+        logos: Optional[List[Tuple[LogoConfig, Image.Image]]] = None
+    ) -> _RenderContext:
+        border_style = options.border_style
+        ctx = _RenderContext(
+            layout=layout,
+            photo=photo,
+            background_color=parse_color(border_style.background_color, (255, 255, 255)),
+            orientation=orientation,
+            photo_mode=photo_mode(photo),
+        )
+
+        if border_style.blur:
+            with self._stage("background"):
+                ctx.background = self._build_blur_background(ctx)
+        if border_style.shadow:
+            with self._stage("shadow"):
+                ctx.shadow = self._build_shadow_mask(layout)
+
+        if border_style.show_exif and options.exif_fields and exif:
+            with self._stage("text"):
+                self._layout_text(ctx, options, exif)
+
+        if logos:
+            with self._stage("logo"):
+                for logo_config, logo in logos:
+                    placed = self._layout_logo(logo_config, logo, layout)
+                    if placed:
+                        ctx.logos.append(placed)
+
+        return ctx
+
+    def _effect_scale(self, layout: Layout) -> float:
+        return min(1.0, EFFECT_MAX_DIMENSION / max(layout.width, layout.height))
+
+    def _build_blur_background(self, ctx: _RenderContext) -> Image.Image:
+        """Cover-scaled, blurred, tinted background at reduced resolution."""
+        layout, photo = ctx.layout, ctx.photo
+        scale = self._effect_scale(layout)
+        size = (max(1, round(layout.width * scale)), max(1, round(layout.height * scale)))
+
+        # Center crop of the photo with the canvas aspect ratio ('cover')
+        width, height = oriented_size(photo.size, ctx.orientation)
+        cover = max(layout.width / width, layout.height / height)
+        crop_width = min(width, layout.width / cover)
+        crop_height = min(height, layout.height / cover)
+        x0 = max(0.0, (width - crop_width) / 2)
+        y0 = max(0.0, (height - crop_height) / 2)
+        box = source_box((x0, y0, x0 + crop_width, y0 + crop_height), photo.size, ctx.orientation)
+
+        # Scale down in stored orientation, then orient and convert the small copy
+        background = photo.resize(
+            oriented_size(size, ctx.orientation), Image.BILINEAR, box=box, reducing_gap=3.0
+        )
+        if ctx.orientation in ORIENTATION_TRANSPOSE:
+            background = background.transpose(ORIENTATION_TRANSPOSE[ctx.orientation])
+        if background.mode != "RGB":
+            background = background.convert("RGB")
+        background = background.filter(ImageFilter.GaussianBlur(max(1.0, BLUR_RADIUS * scale)))
+        overlay = Image.new("RGB", size, ctx.background_color)
+        return Image.blend(background, overlay, BLUR_OVERLAY_ALPHA)
+
+    def _build_shadow_mask(self, layout: Layout) -> Image.Image:
+        """Layered drop shadow alpha mask at reduced resolution."""
+        scale = self._effect_scale(layout)
+        size = (max(1, round(layout.width * scale)), max(1, round(layout.height * scale)))
+        image_width, image_height = layout.image_width, layout.image_height
+
+        base_offset = max(5, min(image_width, image_height) * 0.01)
+        max_blur = max(40, min(image_width, image_height) * 0.1)
+        corner_radius = max(8, min(image_width, image_height) * 0.01)
+
+        mask = Image.new("L", size, 0)
+        for i in range(SHADOW_LAYERS):
+            progress = i / (SHADOW_LAYERS - 1)
+            layer_offset = base_offset + progress * base_offset
+            blur = 3 + progress * max_blur
+            opacity = 0.08 * (1 - progress * 0.6)
+
+            shape = Image.new("L", size, 0)
+            x0 = (layout.image_x + layer_offset) * scale
+            y0 = (layout.image_y + layer_offset) * scale
+            ImageDraw.Draw(shape).rounded_rectangle(
+                (x0, y0, x0 + image_width * scale, y0 + image_height * scale),
+                radius=corner_radius * scale,
+                fill=255,
+            )
+            # Canvas shadowBlur is twice the gaussian standard deviation
+            shadow = shape.filter(ImageFilter.GaussianBlur(blur / 2 * scale))
+            mask = ImageChops.screen(mask, shadow.point(lambda v: round(v * opacity)))
+            mask = ImageChops.screen(mask, shape.point(lambda v: round(v * opacity * 0.5)))
+
+        return mask
+
+    def _layout_text(self, ctx: _RenderContext, options: RenderOptions, exif: ExifData) -> None:
+        lines = build_exif_lines(exif, options.exif_fields)
+        if not lines:
+            return
+
+        layout = ctx.layout
+        font_size = max(1, round(layout.original_width * options.exif_font_size / 100))
+        line_height = font_size * (1 + 1 / 6)
+        block_height = len(lines) * line_height
+
+        text_x = layout.width / 2 + layout.width * options.exif_text_offset_x / 100
+        bottom_border_center = layout.height - layout.bottom_height / 2
+        text_y = (
+            bottom_border_center - block_height / 2
+            + layout.height * options.exif_text_offset_y / 100
+        )
+
+        anchor = TEXT_ANCHORS[options.exif_text_align]
+        ctx.text_font = load_font(options.exif_font_family, font_size)
+        ctx.text_color = parse_color(options.exif_text_color, (51, 51, 51))
+        ctx.line_height = line_height
+        ctx.text_lines = [
+            TextLine(text=line, x=text_x, y=text_y + index * line_height, anchor=anchor)
+            for index, line in enumerate(lines)
+        ]
+
+    def _open_logos(self, options: RenderOptions) -> List[Tuple[LogoConfig, Image.Image]]:
+        """Open the logos to draw (headers only), so they can be planned."""
+        if not options.border_style.show_logo:
+            return []
+        configs = options.logo_configs or ([options.logo_config] if options.logo_config else [])
+        logos = []
+        for logo_config in configs:
+            logo = open_logo_image(logo_config.url)
+            if logo is not None:
+                logos.append((logo_config, logo))
+        return logos
+
+    def _logo_size(self, logo_config: LogoConfig, logo: Image.Image, layout: Layout) -> Tuple[int, int]:
+        logo_width = max(1, round(layout.original_width * logo_config.size / 100))
+        return logo_width, max(1, round(logo.height / logo.width * logo_width))
+
+    def _layout_logo(
+        self,
+        logo_config: LogoConfig,
+        logo: Image.Image,
+        layout: Layout
+    ) -> Optional[Tuple[Image.Image, int, int]]:
+        try:
+            logo.load()
+            logo = logo.convert("RGBA")
+        except Exception as e:
+            print(f"Failed to load logo: {e}")
+            return None
+
+        logo_width, logo_height = self._logo_size(logo_config, logo, layout)
+        logo = logo.resize((logo_width, logo_height), Image.LANCZOS)
+        if logo_config.opacity < 1:
+            alpha = logo.getchannel("A").point(lambda v: round(v * max(0.0, logo_config.opacity)))
+            logo.putalpha(alpha)
+
+        offset_x = layout.width * (logo_config.offset_x or 0) / 100
+        offset_y = layout.height * (logo_config.offset_y or 0) / 100
+        x = layout.width / 2 - logo_width / 2 + offset_x
+        if logo_config.position == "top":
+            y = layout.top_width + offset_y
+        else:
+            y = layout.height - layout.bottom_height / 2 - logo_height / 2 + offset_y
+        return logo, round(x), round(y)
+
+    # ---------- Strips ----------
+
+    def _spool(
+        self,
+        width: int,
+        height: int,
+        render_rows: Callable[[int, int], Image.Image],
+        strip_height: int,
+        progress: Optional[ProgressCallback] = None
+    ) -> SpooledRaster:
+        """Render rows strip by strip into a new spooled raster."""
+        strip_height = min(height, strip_height)
+
+        fd, raster_path = tempfile.mkstemp(suffix=".raw", dir=self.spool_dir)
+        strip_count = 0
+        try:
+            with os.fdopen(fd, "wb") as raster:
+                for y0 in range(0, height, strip_height):
+                    y1 = min(height, y0 + strip_height)
+                    strip = render_rows(y0, y1)
+                    with self._stage("spool"):
+                        raster.write(strip.tobytes("raw", SPOOL_MODE))
+                    strip.close()
+                    strip_count += 1
+                    if progress:
+                        progress(y1, height)
+        except Exception:
+            os.remove(raster_path)
+            raise
+
+        return SpooledRaster(
+            path=raster_path,
+            width=width,
+            height=height,
+            strip_height=strip_height,
+            strip_count=strip_count,
+        )
+
+    def _resample(self, parent: SpooledRaster, width: int, height: int) -> SpooledRaster:
+        """Resample a spooled raster to a new size, strip by strip."""
+        with parent.open_image() as image:
+            scale_y = parent.height / height
+
+            def rows(y0: int, y1: int) -> Image.Image:
+                return image.resize(
+                    (width, y1 - y0),
+                    Image.LANCZOS,
+                    box=(0, y0 * scale_y, parent.width, y1 * scale_y),
+                )
+
+            strip_height = strip_height_for_budget(width * STRIP_BYTES_PER_PIXEL, self.memory_budget)
+            return self._spool(width, height, rows, strip_height)
+
+    def _render_strip(self, ctx: _RenderContext, y0: int, y1: int) -> Image.Image:
+        layout = ctx.layout
+        width, height = layout.width, y1 - y0
+
+        # Background
+        with self._stage("background"):
+            if ctx.background is not None:
+                strip = self._scale_effect_rows(ctx.background, layout, y0, y1)
+            else:
+                strip = Image.new("RGB", (width, height), ctx.background_color)
+
+        # Shadow (behind the photo)
+        if ctx.shadow is not None:
+            with self._stage("shadow"):
+                mask = self._scale_effect_rows(ctx.shadow, layout, y0, y1)
+                strip.paste((0, 0, 0), (0, 0, width, height), mask)
+
+        # Photo rows
+        top = max(y0, layout.image_y)
+        bottom = min(y1, layout.image_y + layout.image_height)
+        if top < bottom:
+            with self._stage("resize"):
+                rows = self._photo_rows(ctx, top - layout.image_y, bottom - layout.image_y)
+                strip.paste(rows, (layout.image_x, top - y0), rows if rows.mode == "RGBA" else None)
+
+        # EXIF text
+        if ctx.text_lines:
+            with self._stage("text"):
+                draw = ImageDraw.Draw(strip)
+                for line in ctx.text_lines:
+                    if line.y < y1 and line.y + ctx.line_height > y0:
+                        draw.text(
+                            (line.x, line.y - y0), line.text,
+                            font=ctx.text_font, fill=ctx.text_color, anchor=line.anchor,
+                        )
+
+        # Logos
+        if ctx.logos:
+            with self._stage("logo"):
+                for logo, x, y in ctx.logos:
+                    if y < y1 and y + logo.height > y0:
+                        strip.paste(logo, (x, y - y0), logo)
+
+        return strip
+
+    def _photo_rows(self, ctx: _RenderContext, top: int, bottom: int) -> Image.Image:
+        """Resample output rows [top, bottom) of the photo region."""
+        layout, photo = ctx.layout, ctx.photo
+        size = (layout.image_width, bottom - top)
+        if ctx.orientation == 1 and photo.mode == ctx.photo_mode:
+            if photo.size == (layout.image_width, layout.image_height):
+                return photo.crop((0, top, photo.width, bottom))
+            scale_y = photo.height / layout.image_height
+            return photo.resize(size, Image.LANCZOS, box=(0, top * scale_y, photo.width, bottom * scale_y))
+
+        # Crop the stored pixels behind these rows (plus filter margin), then
+        # orient and convert only that strip
+        width, height = oriented_size(photo.size, ctx.orientation)
+        scale_y = height / layout.image_height
+        y0, y1 = top * scale_y, bottom * scale_y
+        margin = RESAMPLE_MARGIN * max(1.0, scale_y)
+        r0 = max(0, math.floor(y0 - margin))
+        r1 = min(height, math.ceil(y1 + margin))
+        rows = photo.crop(source_box((0, r0, width, r1), photo.size, ctx.orientation))
+        if ctx.orientation in ORIENTATION_TRANSPOSE:
+            rows = rows.transpose(ORIENTATION_TRANSPOSE[ctx.orientation])
+        if rows.mode != ctx.photo_mode:
+            rows = rows.convert(ctx.photo_mode)
+
+        if (width, height) == (layout.image_width, layout.image_height):
+            return rows.crop((0, top - r0, width, bottom - r0))
+        return rows.resize(size, Image.LANCZOS, box=(0, y0 - r0, width, y1 - r0))
+
+    def _scale_effect_rows(self, effect: Image.Image, layout: Layout, y0: int, y1: int) -> Image.Image:
+        """Upscale rows [y0, y1) of a reduced-resolution effect layer."""
+        scale_y = effect.height / layout.height
+        return effect.resize(
+            (layout.width, y1 - y0),
+            Image.BILINEAR,
+            box=(0, y0 * scale_y, effect.width, y1 * scale_y),
+        )
+
+    # ---------- Encode ----------
+
+    def encode(
+        self,
+        composite: Composite,
+        raster: SpooledRaster,
+        output_path: str,
+        output_format: str = "jpeg",
+        quality: int = 95
+    ) -> None:
+        """
+        Encode a spooled raster with the composite's metadata.
+
+        JPEG reads rows straight from the mapping. PNG cannot store RGBX, so
+        that rendition is converted to RGB in memory, and the WebP encoder
+        copies the whole image; both are planned by _plan_encode.
+        """
+        pil_format = OUTPUT_FORMATS[output_format][0]
+        save_options = {}
+        if output_format != "png":
+            save_options["quality"] = quality
+            if composite.exif_bytes:
+                save_options["exif"] = composite.exif_bytes
+        if composite.icc_profile:
+            save_options["icc_profile"] = composite.icc_profile
+
+        with self._stage("encode"), raster.open_image() as image:
+            if output_format == "png":
+                with image.convert("RGB") as rgb:
+                    rgb.save(output_path, pil_format, **save_options)
+            else:
+                image.save(output_path, pil_format, **save_options)
+
+        if output_format == "jpeg":
+            with self._stage("remux"):
+                remux_metadata(composite.metadata_segments, output_path)
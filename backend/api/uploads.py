@@ -0,0 +1,332 @@
+"""
+Chunked, resumable photo uploads spooled to disk.
+
+A client creates a session, PUTs byte ranges in order and finalizes it.
+Chunks are streamed straight to a spool file while a SHA-256 is updated
+incrementally, so memory per upload is bounded by the transport chunk size
+and the content hash is ready at finalize time. Finalized uploads are
+stored content-addressed (by SHA-256) for cache lookups. Identical uploads
+share one stored file, but each user who uploaded it is recorded as an
+owner and only owners can reference it.
+"""
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.concurrency import run_in_threadpool
+
+
+HASH_READ_SIZE = 1024 * 1024
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadNotFoundError(KeyError):
+    """Upload session or object does not exist (or belongs to another user)."""
+
+
+class UploadConflictError(ValueError):
+    """Another chunk for the same upload is still being written."""
+
+
+class UploadRangeError(ValueError):
+    """Chunk does not continue the upload at its current offset."""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+@dataclass
+class UploadSession:
+    """Upload session state. Persisted as JSON next to the spool file."""
+    id: str
+    user_id: str
+    filename: str
+    size: int
+    content_type: str
+    created_at: float
+    updated_at: float
+    offset: int = 0
+    hasher: Any = field(default=None, repr=False, compare=False)
+    writing: bool = field(default=False, repr=False, compare=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            f.name: getattr(self, f.name)
+            for f in fields(self)
+            if f.name not in ("hasher", "writing")
+        }
+
+
+@dataclass
+class UploadedObject:
+    """A finalized, content-addressed upload."""
+    sha256: str
+    size: int
+    filename: str
+    path: str
+
+
+class UploadManager:
+    """Manages upload sessions and the content-addressed object store."""
+
+    def __init__(
+        self,
+        upload_dir: str,
+        max_size: int = 200 * 1024 * 1024,
+        session_ttl: float = 3600,
+        object_ttl: float = 24 * 3600
+    ):
+        self.upload_dir = upload_dir
+        self.sessions_dir = os.path.join(upload_dir, "sessions")
+        self.objects_dir = os.path.join(upload_dir, "objects")
+        self.owners_dir = os.path.join(upload_dir, "owners")
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        self.object_ttl = object_ttl
+        self.sessions: Dict[str, UploadSession] = {}
+        self.lock = threading.RLock()
+        self._init_storage()
+
+    def _init_storage(self):
+        """Create directories and restore sessions left by a previous process."""
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.owners_dir, exist_ok=True)
+
+        for name in os.listdir(self.sessions_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.sessions_dir, name), 'r', encoding='utf-8') as f:
+                    session = UploadSession(**json.load(f))
+            except (OSError, ValueError, TypeError) as e:
+                print(f"Skipping invalid upload session {name}: {e}")
+                continue
+            # Trust the spool file over the recorded offset; the hash is
+            # rebuilt from it on the next write
+            spool_path = self._spool_path(session.id)
+            session.offset = os.path.getsize(spool_path) if os.path.exists(spool_path) else 0
+            self.sessions[session.id] = session
+
+    # ==================== Sessions ====================
+
+    def create_session(
+        self,
+        user_id: str,
+        filename: str,
+        size: int,
+        content_type: str = "application/octet-stream"
+    ) -> UploadSession:
+        """Create a new upload session."""
+        if size <= 0:
+            raise ValueError("Upload size must be positive")
+        if size > self.max_size:
+            raise ValueError(f"Upload exceeds the maximum size of {self.max_size} bytes")
+
+        now = time.time()
+        session = UploadSession(
+            id=secrets.token_hex(16),
+            user_id=user_id,
+            filename=os.path.basename(filename) or "upload",
+            size=size,
+            content_type=content_type,
+            created_at=now,
+            updated_at=now,
+            hasher=hashlib.sha256(),
+        )
+        with self.lock:
+            open(self._spool_path(session.id), 'wb').close()
+            self._save_session(session)
+            self.sessions[session.id] = session
+        return session
+
+    def get_session(self, upload_id: str, user_id: str) -> UploadSession:
+        """Get a session owned by user_id."""
+        session = self.sessions.get(upload_id)
+        if session is None or session.user_id != user_id:
+            raise UploadNotFoundError(upload_id)
+        return session
+
+    async def write_chunk(
+        self,
+        session: UploadSession,
+        start: int,
+        chunks: AsyncIterator[bytes]
+    ) -> UploadSession:
+        """
+        Append a byte range starting at `start` to the session's spool file.
+
+        The range must begin at or before the current offset; bytes that were
+        already received (a retried chunk) are skipped. Data is written as it
+        arrives, so only one transport chunk is held in memory. File I/O and
+        hashing run in the threadpool, off the event loop.
+        """
+        if session.writing:
+            raise UploadConflictError("Another chunk is being uploaded")
+        if start > session.offset:
+            raise UploadRangeError(
+                f"Chunk starts at {start} but upload is at {session.offset}", session.offset
+            )
+
+        session.writing = True
+        position = start
+        try:
+            if session.hasher is None:
+                # Restored after a restart: re-read what was already received
+                session.hasher = await run_in_threadpool(self._rehash, session)
+            with open(self._spool_path(session.id), 'ab') as f:
+                async for chunk in chunks:
+                    # Skip the part of a retried chunk that is already stored
+                    if position < session.offset:
+                        skip = min(len(chunk), session.offset - position)
+                        position += skip
+                        chunk = chunk[skip:]
+                    if not chunk:
+                        continue
+                    if session.offset + len(chunk) > session.size:
+                        raise UploadRangeError("Chunk extends past the declared size", session.offset)
+                    await run_in_threadpool(self._write_data, f, session.hasher, chunk)
+                    session.offset += len(chunk)
+                    position += len(chunk)
+        finally:
+            # Whatever arrived before a disconnect is kept, so the client can resume
+            session.writing = False
+            session.updated_at = time.time()
+            self._save_session(session)
+        return session
+
+    def finalize(self, session: UploadSession) -> UploadedObject:
+        """Complete an upload and move it into the content-addressed store."""
+        with self.lock:
+            if session.writing:
+                raise UploadConflictError("A chunk is still being uploaded")
+            if session.offset != session.size:
+                raise UploadRangeError(
+                    f"Upload incomplete: {session.offset} of {session.size} bytes", session.offset
+                )
+            if session.hasher is None:
+                session.hasher = self._rehash(session)
+
+            sha256 = session.hasher.hexdigest()
+            object_path = self._object_path(sha256)
+            spool_path = self._spool_path(session.id)
+            if os.path.exists(object_path):
+                # Same content already stored
+                os.remove(spool_path)
+                os.utime(object_path)
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(spool_path, object_path)
+            self._add_owner(sha256, session.user_id)
+
+            self._remove_session(session.id, remove_spool=False)
+            return UploadedObject(
+                sha256=sha256,
+                size=session.size,
+                filename=session.filename,
+                path=object_path,
+            )
+
+    def delete_session(self, session: UploadSession) -> None:
+        """Abort an upload and delete its spool file."""
+        with self.lock:
+            if session.writing:
+                raise UploadConflictError("A chunk is still being uploaded")
+            self._remove_session(session.id)
+
+    # ==================== Objects ====================
+
+    def get_object_path(self, sha256: str, user_id: str) -> str:
+        """Get the path of a finalized upload by content hash, if user_id uploaded it."""
+        if not SHA256_PATTERN.match(sha256):
+            raise UploadNotFoundError(sha256)
+        path = self._object_path(sha256)
+        if not os.path.exists(path) or not os.path.exists(self._owner_path(sha256, user_id)):
+            raise UploadNotFoundError(sha256)
+        # Keep recently used objects from being garbage-collected
+        os.utime(path)
+        return path
+
+    # ==================== Garbage Collection ====================
+
+    def cleanup_expired(self) -> int:
+        """Remove abandoned sessions and unused objects. Returns the number removed."""
+        now = time.time()
+        removed = 0
+        with self.lock:
+            for session in list(self.sessions.values()):
+                if not session.writing and now - session.updated_at > self.session_ttl:
+                    self._remove_session(session.id)
+                    removed += 1
+
+            for root, _dirs, files in os.walk(self.objects_dir):
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        if now - os.path.getmtime(path) > self.object_ttl:
+                            os.remove(path)
+                            shutil.rmtree(self._owners_path(name), ignore_errors=True)
+                            removed += 1
+                    except OSError:
+                        continue
+        return removed
+
+    # ==================== Helper Methods ====================
+
+    def _spool_path(self, upload_id: str) -> str:
+        return os.path.join(self.sessions_dir, f"{upload_id}.part")
+
+    def _object_path(self, sha256: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def _owners_path(self, sha256: str) -> str:
+        return os.path.join(self.owners_dir, sha256[:2], sha256)
+
+    def _owner_path(self, sha256: str, user_id: str) -> str:
+        # One marker file per owner; hashed so any user ID is a safe file name
+        owner = hashlib.sha256(user_id.encode('utf-8')).hexdigest()
+        return os.path.join(self._owners_path(sha256), owner)
+
+    def _add_owner(self, sha256: str, user_id: str) -> None:
+        path = self._owner_path(sha256, user_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'a').close()
+
+    def _save_session(self, session: UploadSession) -> None:
+        path = os.path.join(self.sessions_dir, f"{session.id}.json")
+        with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(session.to_dict(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def _remove_session(self, upload_id: str, remove_spool: bool = True) -> None:
+        self.sessions.pop(upload_id, None)
+        paths = [os.path.join(self.sessions_dir, f"{upload_id}.json")]
+        if remove_spool:
+            paths.append(self._spool_path(upload_id))
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _write_data(f, hasher, data: bytes) -> None:
+        f.write(data)
+        hasher.update(data)
+
+    def _rehash(self, session: UploadSession):
+        """Rebuild the running hash from the spool file (after a restart)."""
+        hasher = hashlib.sha256()
+        with open(self._spool_path(session.id), 'rb') as f:
+            while True:
+                block = f.read(HASH_READ_SIZE)
+                if not block:
+                    break
+                hasher.update(block)
+        return hasher
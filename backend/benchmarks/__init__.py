@@ -0,0 +1 @@
+"""Render pipeline benchmarks: synthetic corpus and regression harness."""
@@ -0,0 +1,113 @@
+"""
+Render benchmark command line.
+
+Run from backend/:
+    python -m benchmarks corpus                      # generate the corpus
+    python -m benchmarks run --output results.json   # benchmark
+    python -m benchmarks run --baseline baseline.json
+    python -m benchmarks compare results.json baseline.json
+
+run and compare exit with status 1 when a regression is found.
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+from benchmarks.corpus import DEFAULT_SIZES, generate_corpus
+from benchmarks.harness import DEFAULT_THRESHOLD, compare_reports, run_benchmark
+
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def parse_sizes(value: str) -> List[float]:
+    try:
+        sizes = [float(size) for size in value.split(",") if size.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("sizes must be comma-separated megapixel counts")
+    if not sizes or any(size <= 0 for size in sizes):
+        raise argparse.ArgumentTypeError("sizes must be positive")
+    return sizes
+
+
+def load_report(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(data: Dict[str, Any], path: str) -> None:
+    if path == "-":
+        json.dump(data, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def print_comparison(comparison: Dict[str, Any]) -> None:
+    for label, entries in (("REGRESSION", comparison["regressions"]),
+                           ("improved", comparison["improvements"])):
+        for entry in entries:
+            change = f"{entry['change']:+.1%}" if entry["change"] is not None else "n/a"
+            print(f"{label:>10}  {entry['case']:<16} {entry['metric']:<26} "
+                  f"{entry['baseline']} -> {entry['current']} ({change})", file=sys.stderr)
+    for entry in comparison["missing"]:
+        print(f"{'missing':>10}  {entry['case']:<16} not in {entry['missing_from']}", file=sys.stderr)
+    print(f"{len(comparison['regressions'])} regression(s) at threshold "
+          f"{comparison['threshold']:.0%}", file=sys.stderr)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Render pipeline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    corpus = commands.add_parser("corpus", help="Generate the synthetic corpus")
+    run = commands.add_parser("run", help="Benchmark the corpus (generating it if needed)")
+    for command in (corpus, run):
+        command.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR)
+        command.add_argument("--sizes", type=parse_sizes, default=list(DEFAULT_SIZES),
+                             help="Comma-separated megapixel sizes (default: 2,12,24)")
+    corpus.add_argument("--force", action="store_true", help="Regenerate every file")
+
+    run.add_argument("--repeat", type=int, default=3, help="Timed renders per photo (median is reported)")
+    run.add_argument("--warmup", type=int, default=1, help="Untimed renders per photo")
+    run.add_argument("--output", default="-", help="Report path (default: stdout)")
+    run.add_argument("--baseline", help="Compare against this report")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    compare = commands.add_parser("compare", help="Compare two reports")
+    compare.add_argument("current")
+    compare.add_argument("baseline")
+    compare.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    compare.add_argument("--output", help="Write the comparison as JSON")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "corpus":
+        generate_corpus(args.corpus_dir, args.sizes, force=args.force)
+        return 0
+
+    if args.command == "run":
+        if args.repeat < 1 or args.warmup < 0:
+            parser.error("--repeat must be at least 1 and --warmup not negative")
+        report = run_benchmark(generate_corpus(args.corpus_dir, args.sizes), args.repeat, args.warmup)
+        if args.baseline:
+            report["comparison"] = compare_reports(report, load_report(args.baseline), args.threshold)
+        write_json(report, args.output)
+        if args.baseline:
+            print_comparison(report["comparison"])
+            return 1 if report["comparison"]["regressions"] else 0
+        return 0
+
+    comparison = compare_reports(load_report(args.current), load_report(args.baseline), args.threshold)
+    if args.output:
+        write_json(comparison, args.output)
+    print_comparison(comparison)
+    return 1 if comparison["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+Deterministic synthetic photo corpus for render benchmarks.
+
+Photos are generated from gradients and a seeded noise tile, so the same
+case always produces the same pixels (and, with the same libjpeg, the same
+file). Cases cover several sizes, EXIF orientations, files with and without
+EXIF, and HDR photos carrying an XMP gain-map description plus an MPF
+secondary image, like the files phones produce.
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import struct
+import sys
+from dataclasses import asdict, dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from PIL import Image, ImageChops, TiffImagePlugin
+
+from api.metadata import (
+    TAG_DATETIME, TAG_DATETIME_ORIGINAL, TAG_EXIF_IFD, TAG_EXPOSURE_TIME, TAG_F_NUMBER,
+    TAG_FOCAL_LENGTH, TAG_ISO, TAG_LENS_MODEL, TAG_MAKE, TAG_MODEL, TAG_ORIENTATION, XMP_HEADER
+)
+
+
+DEFAULT_SIZES = (2, 12, 24)
+# Sensor aspect ratio; rotated cases store landscape pixels with orientation 6
+ASPECT_RATIO = (3, 2)
+NOISE_TILE = 512
+JPEG_QUALITY = 92
+MANIFEST = "manifest.json"
+
+HDR_XMP = (
+    '<x:xmpmeta xmlns:x="adobe:ns:meta/">'
+    '<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+    '<rdf:Description rdf:about="" '
+    'xmlns:hdrgm="http://ns.adobe.com/hdr-gain-map/1.0/" '
+    'xmlns:Container="http://ns.google.com/photos/1.0/container/" '
+    'xmlns:Item="http://ns.google.com/photos/1.0/container/item/" '
+    'hdrgm:Version="1.0">'
+    '<Container:Directory><rdf:Seq>'
+    '<rdf:li rdf:parseType="Resource"><Container:Item Item:Semantic="Primary" Item:Mime="image/jpeg"/></rdf:li>'
+    '<rdf:li rdf:parseType="Resource"><Container:Item Item:Semantic="GainMap" Item:Mime="image/jpeg"/></rdf:li>'
+    '</rdf:Seq></Container:Directory>'
+    '</rdf:Description></rdf:RDF></x:xmpmeta>'
+).encode("utf-8")
+
+
+@dataclass(frozen=True)
+class CorpusCase:
+    """One synthetic photo."""
+    name: str
+    megapixels: float
+    orientation: int
+    exif: bool
+    hdr: bool
+    seed: int
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """Stored pixel size (before orientation is applied)."""
+        ratio_w, ratio_h = ASPECT_RATIO
+        unit = (self.megapixels * 1e6 / (ratio_w * ratio_h)) ** 0.5
+        return round(unit * ratio_w), round(unit * ratio_h)
+
+
+# name, orientation, exif, hdr
+VARIANTS = (
+    ("plain", 1, False, False),
+    ("exif", 1, True, False),
+    ("rotated", 6, True, False),
+    ("hdr", 1, True, True),
+)
+
+
+def corpus_cases(sizes: Iterable[float] = DEFAULT_SIZES) -> List[CorpusCase]:
+    """All variants for each size, in a stable order."""
+    cases = []
+    for megapixels in sizes:
+        for index, (variant, orientation, exif, hdr) in enumerate(VARIANTS):
+            cases.append(CorpusCase(
+                name=f"{megapixels:g}mp-{variant}",
+                megapixels=megapixels,
+                orientation=orientation,
+                exif=exif,
+                hdr=hdr,
+                seed=int(megapixels * 1000) * 10 + index,
+            ))
+    return cases
+
+
+def synthetic_photo(width: int, height: int, seed: int) -> Image.Image:
+    """Smooth gradients plus seeded grain, so JPEG sizes resemble real photos."""
+    rng = random.Random(seed)
+    tile = Image.frombytes("L", (NOISE_TILE, NOISE_TILE), rng.randbytes(NOISE_TILE * NOISE_TILE))
+    grain = Image.new("L", (width, height))
+    for y in range(0, height, NOISE_TILE):
+        for x in range(0, width, NOISE_TILE):
+            grain.paste(tile, (x, y))
+    # Low-frequency structure, like out-of-focus areas
+    blotches = tile.resize((16, 16), Image.BOX).resize((width, height), Image.BICUBIC)
+
+    linear = Image.linear_gradient("L").resize((width, height), Image.BILINEAR)
+    radial = Image.radial_gradient("L").resize((width, height), Image.BILINEAR)
+    diagonal = linear.transpose(Image.Transpose.ROTATE_90).resize((width, height), Image.BILINEAR)
+
+    red = Image.blend(linear, blotches, 0.4)
+    green = Image.blend(radial, blotches, 0.3)
+    blue = Image.blend(diagonal, ImageChops.invert(blotches), 0.4)
+    photo = Image.merge("RGB", (red, green, blue))
+    return Image.blend(photo, Image.merge("RGB", (grain, grain, grain)), 0.12)
+
+
+def build_exif(case: CorpusCase) -> Image.Exif:
+    exif = Image.Exif()
+    exif[TAG_MAKE] = "Benchmark"
+    exif[TAG_MODEL] = f"Synthetic {case.megapixels:g}MP"
+    exif[TAG_ORIENTATION] = case.orientation
+    exif[TAG_DATETIME] = "2024:05:01 10:30:00"
+    exif[TAG_EXIF_IFD] = {
+        TAG_EXPOSURE_TIME: TiffImagePlugin.IFDRational(1, 250),
+        TAG_F_NUMBER: TiffImagePlugin.IFDRational(28, 10),
+        TAG_ISO: 200,
+        TAG_DATETIME_ORIGINAL: "2024:05:01 10:30:00",
+        TAG_FOCAL_LENGTH: TiffImagePlugin.IFDRational(35, 1),
+        TAG_LENS_MODEL: "Synthetic 35mm F2.8",
+    }
+    return exif
+
+
+def _segment(marker: int, payload: bytes) -> bytes:
+    return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+
+
+def _mpf_ifd(primary_size: int, secondary_size: int, secondary_offset: int) -> bytes:
+    ifd = TiffImagePlugin.ImageFileDirectory_v2()
+    ifd[0xB000] = b"0100"  # MPF version
+    ifd[0xB001] = 2  # number of images
+    ifd[0xB002] = (
+        struct.pack("<LLLHH", 0x030000, primary_size, 0, 0, 0)  # baseline primary
+        + struct.pack("<LLLHH", 0x000000, secondary_size, secondary_offset, 0, 0)
+    )
+    return b"II\x2A\x00" + struct.pack("<L", 8) + ifd.tobytes(8)
+
+
+def encode_hdr(photo: Image.Image, exif: Optional[bytes]) -> bytes:
+    """
+    Encode a primary JPEG with gain-map XMP and an MPF index pointing at an
+    appended quarter-resolution gain map.
+    """
+    gain_map = photo.convert("L").resize((max(1, photo.width // 4), max(1, photo.height // 4)))
+    secondary = io.BytesIO()
+    gain_map.save(secondary, "JPEG", quality=85)
+    secondary = secondary.getvalue()
+
+    placeholder = b"MPF\x00" + bytes(len(_mpf_ifd(0, 0, 0)))
+    extra = _segment(0xE1, XMP_HEADER + HDR_XMP) + _segment(0xE2, placeholder)
+    primary = io.BytesIO()
+    photo.save(primary, "JPEG", quality=JPEG_QUALITY, exif=exif or b"", extra=extra)
+    primary = bytearray(primary.getvalue())
+
+    # Offsets in the MP index are relative to the MPF TIFF header
+    header_offset = primary.index(placeholder) + 4
+    ifd = _mpf_ifd(len(primary), len(secondary), len(primary) - header_offset)
+    primary[header_offset:header_offset + len(ifd)] = ifd
+    return bytes(primary) + secondary
+
+
+def write_case(case: CorpusCase, directory: str) -> str:
+    """Generate one case. Returns the file path."""
+    path = os.path.join(directory, f"{case.name}.jpg")
+    photo = synthetic_photo(*case.size, seed=case.seed)
+    exif = build_exif(case).tobytes() if case.exif else None
+
+    if case.hdr:
+        data = encode_hdr(photo, exif)
+    else:
+        buffer = io.BytesIO()
+        photo.save(buffer, "JPEG", quality=JPEG_QUALITY, exif=exif or b"")
+        data = buffer.getvalue()
+
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def generate_corpus(
+    directory: str,
+    sizes: Iterable[float] = DEFAULT_SIZES,
+    force: bool = False
+) -> List[Tuple[CorpusCase, str]]:
+    """
+    Generate the corpus into directory, reusing files that match the manifest.
+
+    The manifest records each case's parameters and SHA-256 so results can
+    be tied to the exact inputs.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    corpus = []
+    for case in corpus_cases(sizes):
+        path = os.path.join(directory, f"{case.name}.jpg")
+        entry = manifest.get(case.name)
+        if not (entry and entry["case"] == asdict(case) and os.path.exists(path)
+                and file_sha256(path) == entry["sha256"]):
+            print(f"Generating {case.name} ({case.size[0]}x{case.size[1]})", file=sys.stderr)
+            write_case(case, directory)
+            manifest[case.name] = {"case": asdict(case), "sha256": file_sha256(path)}
+        corpus.append((case, path))
+
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return corpus
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,268 @@
+"""
+Render pipeline benchmark harness.
+
+Renders every corpus photo with options that exercise all stages (blurred
+background, shadow, EXIF text, logo) and times each stage through the
+renderer's stage hook. Reports per-stage latency (median of the repeats),
+megapixels per second and peak RSS, and compares a run against a stored
+baseline to flag regressions.
+"""
+import base64
+import io
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import PIL
+from PIL import Image, ImageDraw
+
+from api.models import BorderStyle, LogoConfig, RenderOptions
+from api.render_pool import available_cpus, read_process_memory
+from api.renderer import DEFAULT_MEMORY_BUDGET, TiledRenderer
+from benchmarks.corpus import CorpusCase
+
+
+REPORT_VERSION = 1
+STAGES = (
+    "decode", "exif", "resize", "background", "shadow",
+    "text", "logo", "spool", "encode", "remux",
+)
+EXIF_FIELDS = [
+    "make", "model", "iso", "fNumber", "exposureTime", "focalLength", "dateTime", "lensModel",
+]
+
+# A change is a regression when it is worse by more than the threshold and
+# by more than these absolute amounts (filters out timer noise)
+DEFAULT_THRESHOLD = 0.15
+MIN_REGRESSION_MS = 5.0
+MIN_REGRESSION_RSS = 16 * 1024 * 1024
+
+
+class StageTimer:
+    """Stage hook that accumulates wall time per stage."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def __call__(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+
+# ==================== Memory ====================
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter (Linux 4.0+). Returns False if unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss() -> int:
+    """Peak resident set size in bytes (since the last reset, where supported)."""
+    peak = read_process_memory("VmHWM")
+    if peak is not None:
+        return peak
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+# ==================== Benchmark ====================
+
+def benchmark_logo() -> str:
+    """A small deterministic PNG logo as a data: URL."""
+    logo = Image.new("RGBA", (256, 96), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.ellipse((8, 8, 88, 88), fill=(220, 40, 40, 255))
+    draw.rounded_rectangle((100, 28, 248, 68), radius=12, fill=(40, 40, 40, 230))
+    buffer = io.BytesIO()
+    logo.save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def benchmark_options() -> RenderOptions:
+    """Render options that run every pipeline stage."""
+    return RenderOptions(
+        border_style=BorderStyle(
+            type="full",
+            side_width_percent=4,
+            bottom_height_percent=12,
+            blur=True,
+            shadow=True,
+            show_exif=True,
+            show_logo=True,
+        ),
+        logo_config=LogoConfig(id="benchmark", url=benchmark_logo(), size=8),
+        exif_fields=EXIF_FIELDS,
+        quality=90,
+    )
+
+
+def run_case(
+    case: CorpusCase,
+    path: str,
+    options: RenderOptions,
+    work_dir: str,
+    repeat: int = 3,
+    warmup: int = 1,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET
+) -> Dict[str, Any]:
+    """Render one corpus photo `warmup + repeat` times and summarize the timed runs."""
+    output_path = os.path.join(work_dir, f"{case.name}.out.jpg")
+    samples: List[Tuple[Dict[str, float], float, int]] = []
+    exact_rss = True
+
+    for run in range(warmup + repeat):
+        timer = StageTimer()
+        renderer = TiledRenderer(memory_budget=memory_budget, spool_dir=work_dir, stage_hook=timer)
+        exact_rss = reset_peak_rss() and exact_rss
+        start = time.perf_counter()
+        result = renderer.render(path, options, output_path)
+        elapsed = time.perf_counter() - start
+        if run >= warmup:
+            samples.append((dict(timer.seconds), elapsed, peak_rss()))
+
+    total = statistics.median(elapsed for _, elapsed, _ in samples)
+    stages_ms = {
+        stage: round(statistics.median(seconds.get(stage, 0.0) for seconds, _, _ in samples) * 1000, 2)
+        for stage in STAGES
+    }
+    output_size = os.path.getsize(output_path)
+    os.remove(output_path)
+
+    return {
+        "name": case.name,
+        "megapixels": case.megapixels,
+        "source_size": list(case.size),
+        "output_size": [result.width, result.height],
+        "output_bytes": output_size,
+        "stages_ms": stages_ms,
+        "total_ms": round(total * 1000, 2),
+        "megapixels_per_second": round(case.megapixels / total, 3) if total > 0 else None,
+        "peak_rss_bytes": max(rss for _, _, rss in samples),
+        # False when the peak could not be reset and covers the whole process
+        "peak_rss_per_case": exact_rss,
+    }
+
+
+def run_benchmark(
+    corpus: List[Tuple[CorpusCase, str]],
+    repeat: int = 3,
+    warmup: int = 1,
+    memory_budget: int = DEFAULT_MEMORY_BUDGET
+) -> Dict[str, Any]:
+    """Benchmark every corpus case and build the JSON report."""
+    options = benchmark_options()
+    work_dir = tempfile.mkdtemp(prefix="aiphoto-bench-")
+    cases = []
+    try:
+        for case, path in corpus:
+            print(f"Benchmarking {case.name}", file=sys.stderr)
+            cases.append(run_case(case, path, options, work_dir, repeat, warmup, memory_budget))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    total_seconds = sum(case["total_ms"] for case in cases) / 1000
+    total_megapixels = sum(case["megapixels"] for case in cases)
+    return {
+        "version": REPORT_VERSION,
+        "created_at": datetime.utcnow().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "cpus": available_cpus(),
+        },
+        "settings": {
+            "repeat": repeat,
+            "warmup": warmup,
+            "memory_budget": memory_budget,
+        },
+        "cases": cases,
+        "summary": {
+            "total_ms": round(total_seconds * 1000, 2),
+            "megapixels_per_second": (
+                round(total_megapixels / total_seconds, 3) if total_seconds > 0 else None
+            ),
+            "peak_rss_bytes": max((case["peak_rss_bytes"] for case in cases), default=0),
+        },
+    }
+
+
+# ==================== Comparison ====================
+
+def _change(baseline: float, current: float) -> Optional[float]:
+    return round(current / baseline - 1, 4) if baseline else None
+
+
+def compare_reports(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD
+) -> Dict[str, Any]:
+    """
+    Compare a report against a baseline, case by case.
+
+    Stage and total latency and peak RSS regress when they grow by more than
+    `threshold` (and a minimum absolute amount); throughput regresses when it
+    drops by more than `threshold`.
+    """
+    baseline_cases = {case["name"]: case for case in baseline.get("cases", [])}
+    regressions, improvements, missing = [], [], []
+
+    def check(name: str, metric: str, base: Optional[float], cur: Optional[float],
+              higher_is_better: bool = False, min_delta: float = 0.0) -> None:
+        if base is None or cur is None:
+            return
+        worse, better = (base - cur, cur - base) if higher_is_better else (cur - base, base - cur)
+        entry = {
+            "case": name, "metric": metric, "baseline": base, "current": cur,
+            "change": _change(base, cur),
+        }
+        if worse > max(abs(base) * threshold, min_delta):
+            regressions.append(entry)
+        elif better > max(abs(base) * threshold, min_delta):
+            improvements.append(entry)
+
+    for case in current.get("cases", []):
+        base = baseline_cases.pop(case["name"], None)
+        if base is None:
+            missing.append({"case": case["name"], "missing_from": "baseline"})
+            continue
+        for stage, ms in case["stages_ms"].items():
+            check(case["name"], f"stages_ms.{stage}", base["stages_ms"].get(stage), ms,
+                  min_delta=MIN_REGRESSION_MS)
+        check(case["name"], "total_ms", base["total_ms"], case["total_ms"], min_delta=MIN_REGRESSION_MS)
+        check(case["name"], "megapixels_per_second", base["megapixels_per_second"],
+              case["megapixels_per_second"], higher_is_better=True)
+        check(case["name"], "peak_rss_bytes", base["peak_rss_bytes"], case["peak_rss_bytes"],
+              min_delta=MIN_REGRESSION_RSS)
+
+    for name in baseline_cases:
+        missing.append({"case": name, "missing_from": "current"})
+
+    return {
+        "threshold": threshold,
+        "baseline_created_at": baseline.get("created_at"),
+        "current_created_at": current.get("created_at"),
+        "regressions": regressions,
+        "improvements": improvements,
+        "missing": missing,
+    }
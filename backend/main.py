@@ -1,19 +1,46 @@
 """
-FastAPI backend server for AIPhoto user authentication and settings management.
+FastAPI backend server for AIPhoto user authentication, settings management
+and server-side rendering.
 """
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form, Request, Header, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import TypeAdapter, ValidationError
+from PIL import Image
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import os
+import re
+import shutil
+import tempfile
+import zipfile
 from pathlib import Path
+from typing import Optional
 
 from api.csv_storage import CSVStorage
+from api.events import LAGGED_EVENT, Event, EventBus
+from api.jobs import JobManager, JobNotFoundError, job_topic
+from api.render_pool import RenderPool
+from api.renderer import RenderBudgetError, TiledRenderer, source_megapixels
+from api.uploads import (
+    UploadManager,
+    UploadNotFoundError,
+    UploadConflictError,
+    UploadRangeError
+)
 from api.auth import (
     verify_password,
     get_password_hash,
     create_access_token,
-    verify_token
+    create_stream_token,
+    verify_token,
+    verify_stream_token,
+    STREAM_TOKEN_EXPIRE_SECONDS
 )
 from api.models import (
     LoginRequest,
@@ -23,23 +50,61 @@ from api.models import (
     TokenResponse,
     SettingsResponse,
     ErrorResponse,
-    MessageResponse
+    MessageResponse,
+    RenderOptions,
+    OutputSpecList,
+    CreateUploadRequest,
+    UploadSessionResponse,
+    UploadCompleteResponse,
+    CreateJobRequest,
+    JobResponse,
+    StreamTokenResponse
 )
 
 # Load environment variables
 load_dotenv()
 
+UPLOAD_CLEANUP_INTERVAL = 300  # seconds
+SSE_KEEPALIVE_INTERVAL = 15  # seconds
+
+
+async def cleanup_uploads_periodically():
+    """Garbage-collect abandoned upload sessions and finished jobs in the background."""
+    while True:
+        await asyncio.sleep(UPLOAD_CLEANUP_INTERVAL)
+        try:
+            removed = await run_in_threadpool(upload_manager.cleanup_expired)
+            if removed:
+                print(f"Removed {removed} expired upload(s)")
+            removed = await run_in_threadpool(job_manager.cleanup_expired)
+            if removed:
+                print(f"Removed {removed} expired job(s)")
+        except Exception as e:
+            print(f"Upload cleanup error: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background tasks."""
+    event_bus.bind(asyncio.get_running_loop())
+    cleanup_task = asyncio.create_task(cleanup_uploads_periodically())
+    yield
+    cleanup_task.cancel()
+    render_pool.shutdown()
+    storage.flush_snapshot()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AIPhoto API",
     description="User authentication and settings management API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
 cors_origins = os.getenv("CORS_ORIGINS", '["http://localhost:9000", "http://localhost:8080"]')
 try:
-    import json
     cors_origins = json.loads(cors_origins)
 except:
     cors_origins = ["http://localhost:9000", "http://localhost:8080"]
@@ -57,8 +122,37 @@ data_dir = os.path.abspath(os.getenv("DATA_DIR", "./data"))
 print(f"Data directory: {data_dir}")
 storage = CSVStorage(data_dir=data_dir)
 
+# Initialize renderer
+render_spool_dir = os.path.abspath(os.getenv("RENDER_SPOOL_DIR", os.path.join(data_dir, "spool")))
+render_memory_budget = int(os.getenv("RENDER_MEMORY_BUDGET_MB", "512")) * 1024 * 1024
+renderer = TiledRenderer(memory_budget=render_memory_budget, spool_dir=render_spool_dir)
+# Workers default to the CPU count; admission is limited by available memory
+render_pool = RenderPool(
+    max_workers=int(os.getenv("RENDER_WORKERS", "0")) or None,
+    memory_limit=int(os.getenv("RENDER_POOL_MEMORY_MB", "0")) * 1024 * 1024 or None,
+    reserve_bytes=int(os.getenv("RENDER_POOL_RESERVE_MB", "512")) * 1024 * 1024
+)
+
+# Initialize uploads
+upload_manager = UploadManager(
+    upload_dir=os.path.abspath(os.getenv("UPLOAD_DIR", os.path.join(data_dir, "uploads"))),
+    max_size=int(os.getenv("UPLOAD_MAX_SIZE_MB", "200")) * 1024 * 1024,
+    session_ttl=int(os.getenv("UPLOAD_SESSION_TTL_MINUTES", "60")) * 60
+)
+
+# Initialize render jobs
+event_bus = EventBus(queue_size=int(os.getenv("JOB_EVENT_QUEUE_SIZE", "64")))
+job_manager = JobManager(
+    renderer=renderer,
+    pool=render_pool,
+    bus=event_bus,
+    job_dir=os.path.join(render_spool_dir, "jobs"),
+    job_ttl=int(os.getenv("JOB_TTL_MINUTES", "60")) * 60
+)
+
 # Security
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 # ==================== Dependencies ====================
@@ -67,8 +161,31 @@ async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> str:
     """Get current user from JWT token."""
-    token = credentials.credentials
-    user_id = verify_token(token)
+    return authenticate(credentials.credentials)
+
+
+async def get_stream_user(
+    job_id: str,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    token: Optional[str] = Query(
+        None, description="Stream token from POST /jobs/{job_id}/events/token, for EventSource clients"
+    )
+) -> str:
+    """Get current user from the Authorization header or a job stream token."""
+    if credentials is not None:
+        return authenticate(credentials.credentials)
+    if token is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return authenticate(token, job_id=job_id)
+
+
+def authenticate(token: str, job_id: Optional[str] = None) -> str:
+    """Verify a JWT (or a stream token for job_id) and check that its user still exists."""
+    user_id = verify_token(token) if job_id is None else verify_stream_token(token, job_id)
 
     if user_id is None:
         raise HTTPException(
@@ -89,6 +206,84 @@ async def get_current_user(
     return user_id
 
 
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def parse_content_range(content_range: Optional[str]) -> tuple[int, int, int]:
+    """Parse a 'bytes start-end/total' Content-Range header."""
+    match = CONTENT_RANGE_PATTERN.match(content_range or "")
+    if not match:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Content-Range header must be 'bytes start-end/total'"
+        )
+    start, end, total = (int(value) for value in match.groups())
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Content-Range"
+        )
+    return start, end, total
+
+
+def upload_session_response(session) -> UploadSessionResponse:
+    """Build the status response for an upload session."""
+    return UploadSessionResponse(
+        upload_id=session.id,
+        filename=session.filename,
+        size=session.size,
+        offset=session.offset,
+        expires_at=session.updated_at + upload_manager.session_ttl
+    )
+
+
+def get_render_source(file: Optional[UploadFile], sha256: Optional[str], user_id: str):
+    """Resolve the render source: the user's finalized upload (by hash) or a form file."""
+    if sha256:
+        try:
+            return upload_manager.get_object_path(sha256, user_id)
+        except UploadNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Upload not found"
+            )
+    if file is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Either file or sha256 is required"
+        )
+    return file.file
+
+
+def write_renditions_archive(results, archive_path: str) -> None:
+    """Move rendered renditions into a ZIP archive. Blocking."""
+    # Encoded images don't compress further, so store them as-is
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as archive:
+        for result in results:
+            archive.write(result.path, os.path.basename(result.path))
+            os.remove(result.path)
+
+
+async def run_in_render_pool(fn, source, *args):
+    """Run a render through the render pool, sized by the source's header."""
+    try:
+        megapixels = await run_in_threadpool(source_megapixels, source)
+    except OSError:
+        raise ValueError("Unsupported image format")
+    return await asyncio.wrap_future(render_pool.submit(fn, source, *args, megapixels=megapixels))
+
+
+def get_job_or_404(job_id: str, user_id: str):
+    """Get a render job owned by the user."""
+    try:
+        return job_manager.get_job(job_id, user_id)
+    except JobNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+
 # ==================== Health Check ====================
 
 @app.get("/", tags=["Health"])
@@ -111,6 +306,24 @@ async def health_check():
     }
 
 
+@app.get("/ready", tags=["Health"])
+async def readiness_check():
+    """
+    Readiness probe. Returns 503 until the storage indexes are loaded
+    (from the binary snapshot, or rebuilt from the CSV files).
+    """
+    ready = storage.is_ready
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "warming_up",
+            "index_source": storage.index_source,
+            "time_to_ready_ms": round(storage.warmup_seconds() * 1000, 1) if ready else None,
+            "elapsed_ms": round(storage.warmup_seconds() * 1000, 1)
+        }
+    )
+
+
 # ==================== Authentication Endpoints ====================
 
 @app.post(
@@ -258,24 +471,16 @@ async def get_settings(user_id: str = Depends(get_current_user)):
     Get user settings.
     Requires authentication.
     """
-    settings = storage.get_user_settings(user_id)
-
-    # Get updated_at from storage
-    updated_at = None
-    settings_records = []
-    if os.path.exists(storage.settings_file):
-        with open(storage.settings_file, 'r', encoding='utf-8') as f:
-            import csv
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['user_id'] == user_id:
-                    updated_at = row.get('updated_at')
-                    break
-
-    return SettingsResponse(
-        settings=settings or {},
-        updated_at=updated_at
-    )
+    record = storage.get_user_settings_record(user_id)
+    if record is None:
+        return SettingsResponse()
+
+    # The stored JSON was validated on save; send it as-is without parsing
+    body = b''.join((
+        b'{"settings":', record.settings_json,
+        b',"updated_at":', json.dumps(record.updated_at).encode('utf-8'), b'}'
+    ))
+    return Response(content=body, media_type="application/json")
 
 
 @app.post(
@@ -329,6 +534,479 @@ async def delete_settings(user_id: str = Depends(get_current_user)):
         )
 
 
+# ==================== Upload Endpoints ====================
+
+@app.post(
+    "/uploads",
+    response_model=UploadSessionResponse,
+    responses={400: {"model": ErrorResponse}},
+    tags=["Uploads"]
+)
+async def create_upload(
+    request: CreateUploadRequest,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Start a chunked, resumable upload.
+    Requires authentication.
+
+    - **filename**: Original file name
+    - **size**: Total size in bytes
+    - **content_type**: MIME type
+    """
+    try:
+        session = upload_manager.create_session(
+            user_id, request.filename, request.size, request.content_type
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return upload_session_response(session)
+
+
+@app.get(
+    "/uploads/{upload_id}",
+    response_model=UploadSessionResponse,
+    responses={404: {"model": ErrorResponse}},
+    tags=["Uploads"]
+)
+async def get_upload(upload_id: str, user_id: str = Depends(get_current_user)):
+    """
+    Get upload status. Resume by sending the next chunk from `offset`.
+    Requires authentication.
+    """
+    try:
+        session = upload_manager.get_session(upload_id, user_id)
+    except UploadNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    return upload_session_response(session)
+
+
+@app.put(
+    "/uploads/{upload_id}",
+    response_model=UploadSessionResponse,
+    responses={404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}, 416: {"model": ErrorResponse}},
+    tags=["Uploads"]
+)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    content_range: Optional[str] = Header(None),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Upload a byte range of the file as the raw request body.
+    Requires authentication.
+
+    - **Content-Range**: `bytes start-end/total`; start must not be past the
+      current offset (retried bytes are skipped)
+    """
+    try:
+        session = upload_manager.get_session(upload_id, user_id)
+    except UploadNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+
+    start, end, total = parse_content_range(content_range)
+    if total != session.size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Total size {total} does not match upload size {session.size}"
+        )
+
+    async def body_chunks():
+        # Stream the body without buffering it, enforcing the declared range
+        remaining = end - start + 1
+        async for chunk in request.stream():
+            if len(chunk) > remaining:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Request body is longer than Content-Range"
+                )
+            remaining -= len(chunk)
+            yield chunk
+
+    try:
+        await upload_manager.write_chunk(session, start, body_chunks())
+    except UploadConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except UploadRangeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail=str(e),
+            headers={"Range": f"bytes=0-{e.offset - 1}" if e.offset else "bytes=0-0"}
+        )
+
+    return upload_session_response(session)
+
+
+@app.post(
+    "/uploads/{upload_id}/finalize",
+    response_model=UploadCompleteResponse,
+    responses={404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}},
+    tags=["Uploads"]
+)
+async def finalize_upload(upload_id: str, user_id: str = Depends(get_current_user)):
+    """
+    Complete an upload. Returns the SHA-256 used to reference it in render requests.
+    Requires authentication.
+    """
+    try:
+        session = upload_manager.get_session(upload_id, user_id)
+        uploaded = await run_in_threadpool(upload_manager.finalize, session)
+    except UploadNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    except (UploadConflictError, UploadRangeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+    return UploadCompleteResponse(
+        sha256=uploaded.sha256,
+        size=uploaded.size,
+        filename=uploaded.filename
+    )
+
+
+@app.delete(
+    "/uploads/{upload_id}",
+    response_model=MessageResponse,
+    tags=["Uploads"]
+)
+async def delete_upload(upload_id: str, user_id: str = Depends(get_current_user)):
+    """
+    Abort an upload and delete received data.
+    Requires authentication.
+    """
+    try:
+        session = upload_manager.get_session(upload_id, user_id)
+        upload_manager.delete_session(session)
+    except UploadNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    except UploadConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    return MessageResponse(
+        message="Upload deleted successfully",
+        success=True
+    )
+
+
+# ==================== Render Endpoints ====================
+
+@app.post(
+    "/render",
+    response_class=FileResponse,
+    responses={400: {"model": ErrorResponse}, 413: {"model": ErrorResponse}},
+    tags=["Render"]
+)
+async def render_image(
+    file: Optional[UploadFile] = File(None),
+    sha256: Optional[str] = Form(None),
+    options: str = Form("{}"),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Render a bordered JPEG on the server.
+    Requires authentication.
+
+    The output is composited in strips so memory stays within
+    RENDER_MEMORY_BUDGET_MB; photos whose decode does not fit are rejected
+    with 413.
+
+    - **file**: Source photo
+    - **sha256**: Content hash of a finalized upload, instead of file
+    - **options**: JSON render options (same shape as the frontend ProcessOptions)
+    """
+    source = get_render_source(file, sha256, user_id)
+    try:
+        render_options = RenderOptions.model_validate_json(options)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    fd, output_path = tempfile.mkstemp(suffix=".jpg", dir=render_spool_dir)
+    os.close(fd)
+    rendered = False
+    try:
+        result = await run_in_render_pool(renderer.render, source, render_options, output_path)
+        rendered = True
+    except (RenderBudgetError, Image.DecompressionBombError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except (ValueError, OSError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to render image: {str(e)}"
+        )
+    finally:
+        if not rendered:
+            os.remove(output_path)
+
+    return FileResponse(
+        output_path,
+        media_type="image/jpeg",
+        headers={
+            "X-Image-Width": str(result.width),
+            "X-Image-Height": str(result.height)
+        },
+        background=BackgroundTask(os.remove, output_path)
+    )
+
+
+@app.post(
+    "/render/renditions",
+    response_class=FileResponse,
+    responses={400: {"model": ErrorResponse}, 413: {"model": ErrorResponse}},
+    tags=["Render"]
+)
+async def render_renditions(
+    file: Optional[UploadFile] = File(None),
+    sha256: Optional[str] = Form(None),
+    options: str = Form("{}"),
+    outputs: str = Form(...),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Render several renditions (e.g. web, social, full size) in one pass.
+    Requires authentication.
+
+    The photo is decoded and composited once; each rendition is resampled
+    from the nearest larger one. Returns a ZIP archive of the renditions.
+
+    - **file**: Source photo
+    - **sha256**: Content hash of a finalized upload, instead of file
+    - **options**: JSON render options (same shape as the frontend ProcessOptions)
+    - **outputs**: JSON list of output specs, e.g.
+      `[{"name": "web", "sizeMode": "max", "maxSize": 2048, "quality": 85}]`;
+      names must be unique (unnamed specs are named `rendition_<position>`)
+    """
+    source = get_render_source(file, sha256, user_id)
+    try:
+        render_options = RenderOptions.model_validate_json(options)
+        output_specs = TypeAdapter(OutputSpecList).validate_json(outputs)
+    except ValidationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if not output_specs:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one output spec is required"
+        )
+
+    work_dir = tempfile.mkdtemp(dir=render_spool_dir)
+    archive_path = os.path.join(work_dir, "renditions.zip")
+    rendered = False
+    try:
+        results = await run_in_render_pool(
+            renderer.render_renditions, source, render_options, output_specs, work_dir
+        )
+        await run_in_threadpool(write_renditions_archive, results, archive_path)
+        rendered = True
+    except (RenderBudgetError, Image.DecompressionBombError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except (ValueError, OSError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to render image: {str(e)}"
+        )
+    finally:
+        if not rendered:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return FileResponse(
+        archive_path,
+        media_type="application/zip",
+        filename="renditions.zip",
+        background=BackgroundTask(shutil.rmtree, work_dir, ignore_errors=True)
+    )
+
+
+@app.get("/render/pool", tags=["Render"])
+async def get_render_pool(user_id: str = Depends(get_current_user)):
+    """
+    Get render pool load and per-task resource statistics.
+    Requires authentication.
+    """
+    return render_pool.snapshot()
+
+
+# ==================== Job Endpoints ====================
+
+@app.post(
+    "/jobs",
+    response_model=JobResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={400: {"model": ErrorResponse}, 404: {"model": ErrorResponse}},
+    tags=["Jobs"]
+)
+async def create_job(
+    request: CreateJobRequest,
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Render a batch of finalized uploads in the background.
+    Requires authentication.
+
+    Follow progress with GET /jobs/{job_id}/events.
+
+    - **sha256**: Content hashes of finalized uploads
+    - **options**: Render options (same shape as the frontend ProcessOptions)
+    """
+    sources = [(sha256, get_render_source(None, sha256, user_id)) for sha256 in request.sha256]
+    try:
+        job = await run_in_threadpool(job_manager.create_job, user_id, sources, request.options)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return job.to_dict()
+
+
+@app.get(
+    "/jobs/{job_id}",
+    response_model=JobResponse,
+    responses={404: {"model": ErrorResponse}},
+    tags=["Jobs"]
+)
+async def get_job(job_id: str, user_id: str = Depends(get_current_user)):
+    """
+    Get the status of a render job.
+    Requires authentication.
+    """
+    return get_job_or_404(job_id, user_id).to_dict()
+
+
+@app.post(
+    "/jobs/{job_id}/events/token",
+    response_model=StreamTokenResponse,
+    responses={404: {"model": ErrorResponse}},
+    tags=["Jobs"]
+)
+async def create_job_events_token(job_id: str, user_id: str = Depends(get_current_user)):
+    """
+    Issue a short-lived token for GET /jobs/{job_id}/events.
+    Requires authentication.
+
+    For EventSource clients, which cannot send an Authorization header. The
+    token only grants this job's progress stream; request a new one to reconnect
+    after it expires.
+    """
+    job = get_job_or_404(job_id, user_id)
+    return StreamTokenResponse(
+        token=create_stream_token(user_id, job.id),
+        expires_in=STREAM_TOKEN_EXPIRE_SECONDS
+    )
+
+
+@app.get(
+    "/jobs/{job_id}/events",
+    response_class=StreamingResponse,
+    responses={404: {"model": ErrorResponse}},
+    tags=["Jobs"]
+)
+async def get_job_events(
+    job_id: str,
+    request: Request,
+    user_id: str = Depends(get_stream_user)
+):
+    """
+    Stream job progress as Server-Sent Events.
+    Requires authentication (header, or a `token` from POST /jobs/{job_id}/events/token).
+
+    Events:
+    - **snapshot**: Full job status, sent first and again if a slow client's queue overflowed
+    - **task**: A task changed state (queued/running/done/failed)
+    - **progress**: Progress of a running task; stale frames are dropped for slow clients
+    - **stats**: Aggregate throughput (megapixels/s) and ETA
+    - **job**: The job finished; the stream ends after this event
+    """
+    job = get_job_or_404(job_id, user_id)
+
+    async def stream():
+        # Subscribed only once the body is iterated, so an abandoned response leaks nothing.
+        # Subscribe before taking the snapshot so no update falls in between
+        subscription = event_bus.subscribe(job_topic(job.id))
+        try:
+            event = Event(type=LAGGED_EVENT, data={})
+            while True:
+                if event is None:
+                    if await request.is_disconnected():
+                        return
+                    yield b": keep-alive\n\n"
+                elif event.type == LAGGED_EVENT:
+                    # First event, or the queue overflowed: (re)send the full state
+                    snapshot = Event(type="snapshot", data=job.to_dict())
+                    yield snapshot.to_sse()
+                    # The job may finish after the snapshot; its "job" event is then still queued
+                    if snapshot.data["state"] == "completed":
+                        return
+                else:
+                    yield event.to_sse()
+                    if event.type == "job":
+                        return
+                event = await subscription.get(timeout=SSE_KEEPALIVE_INTERVAL)
+        finally:
+            event_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get(
+    "/jobs/{job_id}/tasks/{index}/result",
+    response_class=FileResponse,
+    responses={404: {"model": ErrorResponse}},
+    tags=["Jobs"]
+)
+async def get_job_result(job_id: str, index: int, user_id: str = Depends(get_current_user)):
+    """
+    Download the rendered JPEG of a finished task.
+    Requires authentication.
+    """
+    job = get_job_or_404(job_id, user_id)
+    try:
+        path = job_manager.get_result_path(job, index)
+    except JobNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Result not available"
+        )
+    return FileResponse(path, media_type="image/jpeg", filename=f"{job.tasks[index].sha256[:12]}.jpg")
+
+
 # ==================== Admin Endpoints ====================
 
 @app.get(
@@ -0,0 +1,28 @@
+"""Tests for job progress stream tokens."""
+from datetime import timedelta
+
+from api.auth import create_access_token, create_stream_token, verify_stream_token, verify_token
+
+
+def test_stream_token_is_scoped_to_its_job():
+    token = create_stream_token("user_1", "job_1")
+    assert verify_stream_token(token, "job_1") == "user_1"
+    assert verify_stream_token(token, "job_2") is None
+
+
+def test_stream_token_is_not_an_access_token():
+    assert verify_token(create_stream_token("user_1", "job_1")) is None
+
+
+def test_access_token_is_not_a_stream_token():
+    token = create_access_token(data={"sub": "user_1"})
+    assert verify_token(token) == "user_1"
+    assert verify_stream_token(token, "job_1") is None
+
+
+def test_expired_stream_token_is_rejected():
+    token = create_access_token(
+        data={"sub": "user_1", "job": "job_1", "scope": "job-events"},
+        expires_delta=timedelta(seconds=-1)
+    )
+    assert verify_stream_token(token, "job_1") is None
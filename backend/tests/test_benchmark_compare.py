@@ -0,0 +1,98 @@
+"""Tests for comparing benchmark reports against a baseline."""
+from benchmarks.harness import MIN_REGRESSION_MS, MIN_REGRESSION_RSS, compare_reports
+
+MB = 1024 * 1024
+
+
+def case(name="photo", decode=100.0, total=400.0, mpps=50.0, rss=500 * MB):
+    return {
+        "name": name,
+        "stages_ms": {"decode": decode, "encode": 80.0},
+        "total_ms": total,
+        "megapixels_per_second": mpps,
+        "peak_rss_bytes": rss,
+    }
+
+
+def report(*cases, created_at="2026-01-01T00:00:00"):
+    return {"created_at": created_at, "cases": list(cases)}
+
+
+def metrics(entries):
+    return [(e["case"], e["metric"]) for e in entries]
+
+
+def test_identical_reports_have_no_changes():
+    comparison = compare_reports(report(case()), report(case()))
+    assert comparison["regressions"] == comparison["improvements"] == comparison["missing"] == []
+
+
+def test_latency_beyond_the_threshold_regresses():
+    comparison = compare_reports(report(case(decode=130.0)), report(case()), threshold=0.15)
+    assert metrics(comparison["regressions"]) == [("photo", "stages_ms.decode")]
+    entry = comparison["regressions"][0]
+    assert (entry["baseline"], entry["current"], entry["change"]) == (100.0, 130.0, 0.3)
+    assert comparison["threshold"] == 0.15
+
+
+def test_changes_within_the_threshold_are_ignored():
+    comparison = compare_reports(report(case(decode=110.0, total=380.0)), report(case()), threshold=0.15)
+    assert comparison["regressions"] == comparison["improvements"] == []
+
+
+def test_small_absolute_changes_are_ignored_above_the_threshold():
+    # 2 ms -> 6 ms is +200%, but below MIN_REGRESSION_MS
+    base = case(decode=2.0)
+    current = case(decode=2.0 + MIN_REGRESSION_MS - 1)
+    assert compare_reports(report(current), report(base))["regressions"] == []
+
+    current = case(decode=2.0 + MIN_REGRESSION_MS + 1)
+    assert metrics(compare_reports(report(current), report(base))["regressions"]) == [
+        ("photo", "stages_ms.decode")
+    ]
+
+
+def test_peak_rss_uses_its_own_minimum_delta():
+    base = case(rss=20 * MB)
+    current = case(rss=20 * MB + MIN_REGRESSION_RSS - MB)
+    assert compare_reports(report(current), report(base))["regressions"] == []
+
+    current = case(rss=20 * MB + MIN_REGRESSION_RSS + MB)
+    assert metrics(compare_reports(report(current), report(base))["regressions"]) == [
+        ("photo", "peak_rss_bytes")
+    ]
+
+
+def test_faster_stages_are_improvements():
+    comparison = compare_reports(report(case(decode=50.0, total=300.0)), report(case()))
+    assert comparison["regressions"] == []
+    assert metrics(comparison["improvements"]) == [("photo", "stages_ms.decode"), ("photo", "total_ms")]
+
+
+def test_throughput_is_higher_is_better():
+    comparison = compare_reports(report(case(mpps=30.0)), report(case(mpps=50.0)))
+    assert metrics(comparison["regressions"]) == [("photo", "megapixels_per_second")]
+    assert comparison["regressions"][0]["change"] == -0.4
+
+    comparison = compare_reports(report(case(mpps=70.0)), report(case(mpps=50.0)))
+    assert comparison["regressions"] == []
+    assert metrics(comparison["improvements"]) == [("photo", "megapixels_per_second")]
+
+
+def test_cases_missing_from_either_report_are_listed():
+    current = report(case("a"), case("new", decode=1000.0))
+    baseline = report(case("a"), case("old"), created_at="2025-12-01T00:00:00")
+    comparison = compare_reports(current, baseline)
+    assert comparison["missing"] == [
+        {"case": "new", "missing_from": "baseline"},
+        {"case": "old", "missing_from": "current"},
+    ]
+    # Unmatched cases are not compared
+    assert comparison["regressions"] == []
+    assert comparison["baseline_created_at"] == "2025-12-01T00:00:00"
+
+
+def test_stages_missing_from_the_baseline_are_skipped():
+    current = case()
+    current["stages_ms"]["logo"] = 500.0
+    assert compare_reports(report(current), report(case()))["regressions"] == []
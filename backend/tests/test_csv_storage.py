@@ -0,0 +1,251 @@
+"""Tests for CSV storage: index snapshot and settings log."""
+import time
+
+from api import csv_storage
+from api.csv_storage import CSVStorage
+from api.index_snapshot import load_snapshot, write_snapshot
+
+
+def open_storage(data_dir) -> CSVStorage:
+    storage = CSVStorage(data_dir=str(data_dir))
+    assert storage._ready.wait(5)
+    return storage
+
+
+def add_user(storage: CSVStorage, name: str):
+    return storage.create_user(name, f"{name}@example.com", "hash")
+
+
+def wait_for_index(storage: CSVStorage, timeout: float = 5.0) -> None:
+    """Wait until a background rebuild has caught up with the files."""
+    deadline = time.monotonic() + timeout
+    while storage._generation != storage._current_generation():
+        assert time.monotonic() < deadline, "index was not rebuilt"
+        time.sleep(0.01)
+
+
+# ==================== Index Snapshot ====================
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "index.snapshot")
+    tables = [(2, [["a", "b"], ["c", ""]]), (1, [])]
+    assert write_snapshot(path, (1, 2, 3, 4), tables)
+    assert load_snapshot(path, (1, 2, 3, 4)) == [[("a", "b"), ("c", "")], []]
+
+
+def test_snapshot_rejects_other_generation(tmp_path):
+    path = str(tmp_path / "index.snapshot")
+    write_snapshot(path, (1, 2, 3, 4), [(1, [["a"]])])
+    assert load_snapshot(path, (1, 2, 3, 5)) is None
+
+
+def test_snapshot_rejects_corruption(tmp_path):
+    path = tmp_path / "index.snapshot"
+    write_snapshot(str(path), (1, 2, 3, 4), [(1, [["value"]])])
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    assert load_snapshot(str(path), (1, 2, 3, 4)) is None
+
+
+def test_snapshot_refuses_separator_in_values(tmp_path):
+    path = str(tmp_path / "index.snapshot")
+    assert not write_snapshot(path, (1, 2, 3, 4), [(1, [["a\x00b"]])])
+    assert load_snapshot(path, (1, 2, 3, 4)) is None
+
+
+def test_restart_loads_snapshot_after_flush(tmp_path):
+    storage = open_storage(tmp_path)
+    assert storage.index_source == "csv"
+    user = add_user(storage, "alice")
+    storage.save_user_settings(user.id, {"theme": "dark"})
+    storage.flush_snapshot()
+
+    restarted = open_storage(tmp_path)
+    assert restarted.index_source == "snapshot"
+    assert restarted.get_user_by_username("alice").id == user.id
+    assert restarted.get_user_settings(user.id) == {"theme": "dark"}
+
+
+def test_writes_do_not_rewrite_snapshot_synchronously(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_storage, "SNAPSHOT_DELAY", 3600)
+    storage = open_storage(tmp_path)
+    snapshot = tmp_path / "index.snapshot"
+    # Written by the start-up rebuild right after the indexes are ready
+    deadline = time.monotonic() + 5
+    while not snapshot.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    before = snapshot.read_bytes()
+
+    user = add_user(storage, "alice")
+    for value in range(5):
+        storage.save_user_settings(user.id, {"value": value})
+    assert snapshot.read_bytes() == before
+
+    storage.flush_snapshot()
+    assert snapshot.read_bytes() != before
+
+
+def test_stale_snapshot_is_rebuilt_from_csv(tmp_path):
+    storage = open_storage(tmp_path)
+    add_user(storage, "alice")
+    storage.flush_snapshot()
+    # Written by another process after the snapshot
+    add_user(CSVStorage(data_dir=str(tmp_path)), "bob")
+
+    restarted = open_storage(tmp_path)
+    assert restarted.index_source == "csv"
+    assert restarted.get_user_by_username("bob") is not None
+
+
+def test_reads_scan_csv_while_warming_up(tmp_path, monkeypatch):
+    add_user(open_storage(tmp_path), "alice")
+    (tmp_path / "index.snapshot").unlink()
+    monkeypatch.setattr(CSVStorage, "_rebuild", lambda self: None)
+
+    storage = CSVStorage(data_dir=str(tmp_path))
+    assert not storage.is_ready
+    assert storage.get_user_by_username("alice").email == "alice@example.com"
+    assert storage.get_user_by_email("nobody@example.com") is None
+
+
+def test_index_follows_writes_from_another_process(tmp_path):
+    storage = open_storage(tmp_path)
+    other = open_storage(tmp_path)
+    user = add_user(other, "alice")
+    # File generation changed underneath; the lookup must not use the stale index
+    assert storage.get_user_by_id(user.id) is not None
+
+
+def test_local_write_after_another_workers_write_rebuilds(tmp_path):
+    first = open_storage(tmp_path)
+    second = open_storage(tmp_path)
+    second.save_user_settings("bob", {"v": 1})
+    # The file now holds bob's record, which the first worker has not indexed
+    first.save_user_settings("alice", {"v": 2})
+
+    assert first.get_user_settings("bob") == {"v": 1}
+    wait_for_index(first)
+    assert first.get_user_settings("bob") == {"v": 1}
+    assert first.get_user_settings("alice") == {"v": 2}
+
+
+def test_user_writes_from_two_workers_are_indexed(tmp_path):
+    first = open_storage(tmp_path)
+    second = open_storage(tmp_path)
+    bob = add_user(second, "bob")
+    alice = add_user(first, "alice")
+    first.update_user_last_login(alice.id)
+
+    wait_for_index(first)
+    assert first.get_user_by_username("bob").id == bob.id
+    assert first.get_user_by_id(alice.id).last_login is not None
+
+
+# ==================== Settings Log ====================
+
+def test_settings_log_latest_record_wins(tmp_path):
+    storage = open_storage(tmp_path)
+    storage.save_user_settings("u1", {"theme": "light"})
+    storage.save_user_settings("u1", {"theme": "dark", "note": "tab\there"})
+    storage.save_user_settings("u2", {"theme": "light"})
+
+    assert storage.get_user_settings("u1") == {"theme": "dark", "note": "tab\there"}
+    assert storage.get_user_settings_record("u1").settings_json == b'{"theme":"dark","note":"tab\\there"}'
+    assert (tmp_path / "user_settings.dat").read_bytes().count(b"\n") == 3
+    assert open_storage(tmp_path).get_user_settings("u1")["theme"] == "dark"
+
+
+def test_settings_tombstone_deletes(tmp_path):
+    storage = open_storage(tmp_path)
+    storage.save_user_settings("u1", {"theme": "dark"})
+    storage.delete_user_settings("u1")
+    assert storage.get_user_settings("u1") is None
+    assert (tmp_path / "user_settings.dat").read_bytes().endswith(b"\t\n")
+    # Deleting again writes nothing
+    size = (tmp_path / "user_settings.dat").stat().st_size
+    storage.delete_user_settings("u1")
+    assert (tmp_path / "user_settings.dat").stat().st_size == size
+    assert open_storage(tmp_path).get_user_settings("u1") is None
+
+
+def test_settings_appends_from_two_workers_are_kept(tmp_path):
+    first = open_storage(tmp_path)
+    second = open_storage(tmp_path)
+    for i in range(20):
+        first.save_user_settings(f"a{i}", {"i": i})
+        second.save_user_settings(f"b{i}", {"i": i})
+
+    restarted = open_storage(tmp_path)
+    for i in range(20):
+        assert restarted.get_user_settings(f"a{i}") == {"i": i}
+        assert restarted.get_user_settings(f"b{i}") == {"i": i}
+
+
+def test_torn_tail_is_repaired_at_start_up(tmp_path):
+    storage = open_storage(tmp_path)
+    storage.save_user_settings("u1", {"theme": "dark"})
+    log = tmp_path / "user_settings.dat"
+    complete = log.read_bytes()
+    log.write_bytes(complete + b'u2\t2024-01-01T00:00:00\t{"the')
+
+    restarted = open_storage(tmp_path)
+    assert log.read_bytes() == complete
+    assert restarted.get_user_settings("u1") == {"theme": "dark"}
+    assert restarted.get_user_settings("u2") is None
+
+
+def test_record_appended_to_torn_line_is_not_misread():
+    line = b'u2\t2024-01-01T00:00:00\t{"theu3\t2024-01-01T00:00:01\t{"theme":"light"}'
+    assert csv_storage.UserSettings.from_line(line) is None
+
+
+def test_settings_log_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_storage, "SETTINGS_COMPACT_MIN_BYTES", 1024)
+    storage = open_storage(tmp_path)
+    for i in range(100):
+        storage.save_user_settings("u1", {"revision": i})
+    storage.save_user_settings("u2", {"theme": "dark"})
+    storage.delete_user_settings("u2")
+
+    lines = (tmp_path / "user_settings.dat").read_bytes().splitlines()
+    assert len(lines) < 50
+    assert storage.get_user_settings("u1") == {"revision": 99}
+    assert storage.get_user_settings("u2") is None
+    assert open_storage(tmp_path).get_user_settings("u1") == {"revision": 99}
+
+
+def test_compaction_keeps_other_workers_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_storage, "SETTINGS_COMPACT_MIN_BYTES", 1024)
+    first = open_storage(tmp_path)
+    second = open_storage(tmp_path)
+    first.save_user_settings("alice", {"v": 0})
+    second.save_user_settings("bob", {"v": 1})
+    # Even an index that believes it is current but lacks bob must not drop him
+    first._generation = first._current_generation()
+    assert "bob" not in first._settings
+
+    for i in range(100):
+        first.save_user_settings("alice", {"v": i})
+
+    assert len((tmp_path / "user_settings.dat").read_bytes().splitlines()) < 50
+    restarted = open_storage(tmp_path)
+    assert restarted.get_user_settings("bob") == {"v": 1}
+    assert restarted.get_user_settings("alice") == {"v": 99}
+
+
+def test_legacy_settings_csv_is_migrated(tmp_path):
+    (tmp_path / "user_settings.csv").write_text(
+        "user_id,settings_json,updated_at\n"
+        'u1,"{""theme"": ""dark"", ""sizes"": [1, 2]}",2024-01-01T00:00:00\n'
+        "u2,not json,2024-01-01T00:00:00\n",
+        encoding="utf-8",
+    )
+    storage = open_storage(tmp_path)
+    assert storage.get_user_settings("u1") == {"theme": "dark", "sizes": [1, 2]}
+    assert storage.get_user_settings_record("u1").updated_at == "2024-01-01T00:00:00"
+    assert storage.get_user_settings("u2") is None
+    assert not (tmp_path / "user_settings.csv").exists()
+    assert (tmp_path / "user_settings.csv.migrated").exists()
+    # Runs once
+    assert open_storage(tmp_path).get_user_settings("u1") == {"theme": "dark", "sizes": [1, 2]}
@@ -0,0 +1,130 @@
+"""Tests for subscriber queues and event fan-out."""
+import asyncio
+
+from api.events import LAGGED_EVENT, Event, EventBus, Subscription
+
+
+def progress(index, value):
+    return Event(type="progress", data={"index": index, "progress": value}, key=f"progress:{index}")
+
+
+def task(index, state):
+    return Event(type="task", data={"index": index, "state": state}, key=f"task:{index}", droppable=False)
+
+
+def drain(subscription):
+    async def run():
+        events = []
+        while True:
+            event = await subscription.get(timeout=0)
+            if event is None:
+                return events
+            events.append(event)
+    return asyncio.run(run())
+
+
+def test_events_with_the_same_key_are_coalesced():
+    subscription = Subscription("job", max_size=8)
+    subscription.put(progress(0, 0.1))
+    subscription.put(task(1, "running"))
+    subscription.put(progress(0, 0.2))
+    subscription.put(task(1, "done"))
+
+    events = drain(subscription)
+    assert [(e.type, e.data) for e in events] == [
+        ("progress", {"index": 0, "progress": 0.2}),
+        ("task", {"index": 1, "state": "done"}),
+    ]
+    assert subscription.dropped == 2
+
+
+def test_full_queue_drops_the_oldest_progress_frames():
+    subscription = Subscription("job", max_size=3)
+    for index in range(3):
+        subscription.put(progress(index, 0.5))
+    subscription.put(Event(type="stats", data={}, key="stats"))
+    subscription.put(progress(3, 0.5))
+
+    events = drain(subscription)
+    assert [e.key for e in events] == ["progress:2", "stats", "progress:3"]
+    assert subscription.dropped == 2
+
+
+def test_task_and_job_events_are_never_dropped_for_progress():
+    subscription = Subscription("job", max_size=3)
+    subscription.put(task(0, "running"))
+    subscription.put(progress(0, 0.5))
+    subscription.put(Event(type="stats", data={}, key="stats"))
+    subscription.put(task(0, "done"))
+    subscription.put(Event(type="job", data={"state": "completed"}))
+
+    events = drain(subscription)
+    assert [e.type for e in events] == ["stats", "task", "job"]
+    assert events[1].data["state"] == "done"
+    assert not subscription.lagging
+
+
+def test_overflow_of_state_events_is_bounded_and_reported_once():
+    subscription = Subscription("job", max_size=4)
+    subscription.put(progress(0, 0.5))
+    for index in range(100):
+        subscription.put(task(index, "done"))
+        assert len(subscription._events) <= 4
+    subscription.put(task(100, "done"))
+
+    # Everything queued before the overflow is superseded by one LAGGED_EVENT
+    events = drain(subscription)
+    assert [e.type for e in events] == [LAGGED_EVENT]
+    assert subscription.dropped == 102
+    subscription.put(task(101, "done"))
+    assert [e.data["index"] for e in drain(subscription)] == [101]
+
+
+def test_get_times_out_and_wakes_on_put():
+    subscription = Subscription("job")
+
+    async def run():
+        assert await subscription.get(timeout=0.01) is None
+        waiter = asyncio.ensure_future(subscription.get(timeout=5))
+        await asyncio.sleep(0)
+        subscription.put(task(0, "running"))
+        return await waiter
+
+    assert asyncio.run(run()).data == {"index": 0, "state": "running"}
+
+
+def test_dispatch_fans_out_to_the_topic_subscribers_only():
+    bus = EventBus(queue_size=2)
+    first, second = bus.subscribe("job:a"), bus.subscribe("job:a")
+    other = bus.subscribe("job:b")
+    for index in range(3):
+        bus._dispatch("job:a", progress(index, 1.0))
+    bus._dispatch("job:a", Event(type="job", data={}))
+
+    for subscription in (first, second):
+        assert [e.type for e in drain(subscription)] == ["progress", "job"]
+        assert subscription.dropped == 2
+    assert drain(other) == []
+
+    bus.unsubscribe(first)
+    bus.unsubscribe(second)
+    bus._dispatch("job:a", Event(type="job", data={}))
+    assert drain(first) == []
+    assert "job:a" not in bus._subscribers
+
+
+def test_publish_from_another_thread_reaches_subscribers():
+    bus = EventBus()
+
+    async def run():
+        bus.bind(asyncio.get_running_loop())
+        subscription = bus.subscribe("job:a")
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, lambda: bus.publish(
+            "job:a", "task", {"index": 0}, key="task:0", droppable=False
+        ))
+        return await subscription.get(timeout=5)
+
+    event = asyncio.run(run())
+    assert (event.type, event.key, event.droppable) == ("task", "task:0", False)
+    assert event.id == 1
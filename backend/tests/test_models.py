@@ -0,0 +1,24 @@
+"""Tests for request model validation."""
+import pytest
+from pydantic import TypeAdapter, ValidationError
+
+from api.models import OutputSpecList
+
+
+def validate_outputs(outputs):
+    return TypeAdapter(OutputSpecList).validate_python(outputs)
+
+
+def test_unnamed_outputs_are_named_by_position():
+    specs = validate_outputs([{"name": "web"}, {}, {"sizeMode": "max", "maxSize": 100}])
+    assert [spec.name for spec in specs] == ["web", "rendition_2", "rendition_3"]
+
+
+@pytest.mark.parametrize("outputs", [
+    [{"name": "web"}, {"name": "web", "format": "png"}],
+    [{"name": "web"}, {"name": "WEB"}],
+    [{"name": "rendition_2"}, {}],
+])
+def test_duplicate_output_names_are_rejected(outputs):
+    with pytest.raises(ValidationError, match="Duplicate output name"):
+        validate_outputs(outputs)
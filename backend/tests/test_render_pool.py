@@ -0,0 +1,128 @@
+"""Tests for render pool admission and scheduling."""
+import threading
+import time
+
+import pytest
+
+from api import render_pool
+from api.render_pool import MB, RenderPool
+
+
+GB = 1024 * MB
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    """Fixed MemAvailable and anonymous RSS; tests change them through the dict."""
+    state = {"available": 4 * GB, "rss": 1 * GB}
+    monkeypatch.setattr(render_pool, "read_mem_available", lambda: state["available"])
+    monkeypatch.setattr(render_pool, "read_process_memory", lambda name="RssAnon": state["rss"])
+    monkeypatch.setattr(render_pool, "release_free_memory", lambda: None)
+    monkeypatch.setattr(render_pool, "MEMINFO_MAX_AGE", 0.0)
+    return state
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def blocking_tasks(pool, count, megapixels):
+    release = threading.Event()
+    futures = [pool.submit(release.wait, 5, megapixels=megapixels) for _ in range(count)]
+    return release, futures
+
+
+def test_burst_is_admitted_against_unallocated_estimates(memory):
+    pool = RenderPool(max_workers=8, reserve_bytes=512 * MB)
+    # 80 MP at the initial 10 MB per megapixel: 800 MB each, 3.5 GB of headroom
+    release, futures = blocking_tasks(pool, 8, megapixels=80)
+    wait_for(lambda: pool.snapshot()["running"] == 4)
+    time.sleep(0.1)
+    assert pool.snapshot()["running"] == 4
+    assert pool.snapshot()["committed_bytes"] <= 3.5 * GB
+
+    release.set()
+    for future in futures:
+        future.result(5)
+    pool.shutdown()
+
+
+def test_allocated_memory_is_not_counted_twice(memory):
+    pool = RenderPool(max_workers=8, reserve_bytes=512 * MB)
+    release, futures = blocking_tasks(pool, 1, megapixels=80)
+    wait_for(lambda: pool.snapshot()["running"] == 1)
+
+    # The running render has allocated its 800 MB
+    memory["rss"] += 800 * MB
+    memory["available"] -= 800 * MB
+    snapshot = pool.snapshot()
+    assert snapshot["allocated_bytes"] == 800 * MB
+    assert snapshot["capacity_bytes"] == 3.5 * GB
+
+    release.set()
+    futures[0].result(5)
+    pool.shutdown()
+
+
+def test_large_tasks_do_not_run_together(memory):
+    memory["available"] = 16 * GB
+    pool = RenderPool(max_workers=4, reserve_bytes=0)
+    # 5 GB each: above a quarter of the capacity, though two would fit
+    release, futures = blocking_tasks(pool, 2, megapixels=500)
+    small_release, small = blocking_tasks(pool, 1, megapixels=10)
+    wait_for(lambda: pool.snapshot()["running"] == 2)
+    time.sleep(0.1)
+    snapshot = pool.snapshot()
+    assert snapshot["running"] == 2
+    assert snapshot["large_running"] == 1
+
+    release.set()
+    small_release.set()
+    for future in futures + small:
+        future.result(5)
+    pool.shutdown()
+
+
+def test_task_passed_over_too_often_runs_next(memory):
+    memory["available"] = 64 * GB
+    pool = RenderPool(max_workers=1, reserve_bytes=0)
+    order = []
+    release, blocker = blocking_tasks(pool, 1, megapixels=1)
+    wait_for(lambda: pool.snapshot()["running"] == 1)
+
+    futures = [pool.submit(order.append, "small", megapixels=1)]
+    futures += [pool.submit(order.append, f"large{i}", megapixels=10) for i in range(10)]
+    release.set()
+    for future in blocker + futures:
+        future.result(5)
+    pool.shutdown()
+
+    # Larger tasks go first, until the small one has been skipped MAX_SKIPS times
+    assert order.index("small") == render_pool.MAX_SKIPS
+    assert order == [f"large{i}" for i in range(8)] + ["small", "large8", "large9"]
+
+
+def test_memory_is_measured_only_for_renders_that_ran_alone(memory):
+    pool = RenderPool(max_workers=2, reserve_bytes=0)
+
+    def allocate():
+        # Held long enough to be sampled, then freed
+        memory["rss"] += 200 * MB
+        time.sleep(20 * render_pool.MEMORY_SAMPLE_INTERVAL)
+        memory["rss"] -= 200 * MB
+
+    pool.submit(allocate, megapixels=10).result(5)
+    assert pool.stats.recent[-1].memory_bytes == 200 * MB
+    # 20 MB per megapixel pulls the estimate up from the initial 10
+    assert pool.stats.bytes_per_megapixel > render_pool.INITIAL_BYTES_PER_MEGAPIXEL
+
+    release, futures = blocking_tasks(pool, 2, megapixels=10)
+    wait_for(lambda: pool.snapshot()["running"] == 2)
+    release.set()
+    for future in futures:
+        future.result(5)
+    pool.shutdown()
+    assert [record.memory_bytes for record in list(pool.stats.recent)[1:]] == [None, None]
@@ -0,0 +1,161 @@
+"""Tests for the tiled renderer and JPEG metadata handling."""
+import base64
+import io
+
+import pytest
+from PIL import Image, ImageChops, ImageOps
+
+from api.metadata import read_metadata_segments, strip_auxiliary_xmp
+from api.models import BorderStyle, LogoConfig, OutputSpec, RenderOptions
+from api.renderer import MAX_LOGO_PIXELS, RenderBudgetError, TiledRenderer, open_logo_image
+
+
+def make_jpeg(mode: str = "RGB", orientation: int = 1, size=(301, 203)) -> bytes:
+    image = Image.effect_mandelbrot(size, (-2, -1, 1, 1), 60).convert(mode)
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=exif.tobytes(), quality=95)
+    return buffer.getvalue()
+
+
+def composite_pixels(renderer: TiledRenderer, data: bytes, options: RenderOptions) -> Image.Image:
+    composite = renderer.composite(io.BytesIO(data), options)
+    try:
+        with composite.raster.open_image() as image:
+            return image.convert("RGB")
+    finally:
+        composite.close()
+
+
+def max_difference(a: Image.Image, b: Image.Image) -> int:
+    return max(high for _, high in ImageChops.difference(a, b).getextrema())
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L", "CMYK"])
+# 0 and 9 are out of range (broken files) and treated as 1
+@pytest.mark.parametrize("orientation", [*range(1, 9), 0, 9])
+def test_orientation_and_conversion_applied_per_strip(tmp_path, mode, orientation):
+    data = make_jpeg(mode, orientation)
+    renderer = TiledRenderer(memory_budget=16 * 1024 * 1024, spool_dir=str(tmp_path))
+    options = RenderOptions(border_style=BorderStyle(bottom_height=0))
+
+    expected = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+    assert max_difference(composite_pixels(renderer, data, options), expected) == 0
+
+
+@pytest.mark.parametrize("orientation", [1, 3, 6, 8])
+@pytest.mark.parametrize("output_width", [None, 500, 1400])
+def test_strip_height_does_not_change_output(tmp_path, orientation, output_width):
+    data = make_jpeg("RGB", orientation, size=(900, 600))
+    options = RenderOptions(
+        border_style=BorderStyle(
+            type="full", side_width_percent=5, bottom_height_percent=10, blur=True, shadow=True
+        ),
+        output_width=output_width,
+    )
+    large = TiledRenderer(memory_budget=512 * 1024 * 1024, spool_dir=str(tmp_path))
+    small = TiledRenderer(memory_budget=20 * 1024 * 1024, spool_dir=str(tmp_path))
+
+    difference = max_difference(
+        composite_pixels(large, data, options), composite_pixels(small, data, options)
+    )
+    assert difference <= 1
+
+
+def test_source_over_budget_is_rejected_before_decoding(tmp_path):
+    data = make_jpeg("RGB", 6, size=(2000, 1500))
+    renderer = TiledRenderer(memory_budget=4 * 1024 * 1024, spool_dir=str(tmp_path))
+    with pytest.raises(RenderBudgetError):
+        renderer.composite(io.BytesIO(data), RenderOptions())
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_planned_memory_within_budget(tmp_path):
+    data = make_jpeg("RGB", 6, size=(2000, 1500))
+    budget = 32 * 1024 * 1024
+    renderer = TiledRenderer(memory_budget=budget, spool_dir=str(tmp_path))
+    composite = renderer.composite(io.BytesIO(data), RenderOptions(border_style=BorderStyle(blur=True)))
+    composite.close()
+    assert composite.memory_bytes <= budget
+
+
+def test_rendition_encode_memory_is_planned(tmp_path):
+    data = make_jpeg("RGB", 1, size=(1600, 1200))
+    budget = 32 * 1024 * 1024
+    renderer = TiledRenderer(memory_budget=budget, spool_dir=str(tmp_path))
+    options = RenderOptions(border_style=BorderStyle(bottom_height=0))
+
+    # A full-size WebP copy does not fit; a smaller one and a full-size JPEG do
+    with pytest.raises(RenderBudgetError):
+        renderer.render_renditions(io.BytesIO(data), options, [OutputSpec(format="webp")], str(tmp_path))
+    assert list(tmp_path.iterdir()) == []
+
+    outputs = [OutputSpec(name="full"), OutputSpec(name="small", size_mode="max", max_size=800, format="webp")]
+    results = renderer.render_renditions(io.BytesIO(data), options, outputs, str(tmp_path))
+    assert [(r.width, r.height) for r in results] == [(1600, 1200), (800, 600)]
+    assert max(r.memory_bytes for r in results) <= budget
+
+
+def test_spooled_raster_is_not_written_through(tmp_path):
+    renderer = TiledRenderer(spool_dir=str(tmp_path))
+    composite = renderer.composite(io.BytesIO(make_jpeg()), RenderOptions())
+    try:
+        before = open(composite.raster.path, "rb").read()
+        with composite.raster.open_image() as image:
+            image.paste((255, 0, 0), (0, 0, 10, 10))
+        assert open(composite.raster.path, "rb").read() == before
+    finally:
+        composite.close()
+
+
+def logo_url(size) -> str:
+    buffer = io.BytesIO()
+    Image.new("RGBA", size, (200, 0, 0, 255)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def test_oversized_logo_is_skipped_before_decoding():
+    # Compresses to a few kilobytes, but would decode to 16 MP
+    assert open_logo_image(logo_url((4096, 4096))) is None
+    assert open_logo_image(logo_url((256, 96))).size == (256, 96)
+    assert 4096 * 4096 > MAX_LOGO_PIXELS
+
+
+def test_logo_memory_is_planned(tmp_path):
+    data = make_jpeg("RGB", 1, size=(900, 600))
+    renderer = TiledRenderer(memory_budget=32 * 1024 * 1024, spool_dir=str(tmp_path))
+
+    def options(size):
+        # A 1 x 2000 logo at `size` percent of the width is resized to a very tall image
+        return RenderOptions(
+            border_style=BorderStyle(show_logo=True),
+            logo_config=LogoConfig(id="logo", url=logo_url((1, 2000)), size=size),
+        )
+
+    with pytest.raises(RenderBudgetError):
+        renderer.composite(io.BytesIO(data), options(50))
+    renderer.composite(io.BytesIO(data), options(0.5)).close()
+
+
+def test_auxiliary_xmp_is_stripped():
+    packet = (
+        b'<rdf:Description xmp:Rating="4" hdrgm:Version="1.0" GCamera:MotionPhoto="1">'
+        b"<hdrgm:GainMapMax>2.3</hdrgm:GainMapMax>"
+        b"<Container:Directory><rdf:Seq><rdf:li/></rdf:Seq></Container:Directory>"
+        b"<dc:title>kept</dc:title></rdf:Description>"
+    )
+    assert strip_auxiliary_xmp(packet) == (
+        b'<rdf:Description xmp:Rating="4"><dc:title>kept</dc:title></rdf:Description>'
+    )
+
+
+def test_metadata_segments_drop_gain_map_references():
+    from benchmarks.corpus import encode_hdr
+
+    data = encode_hdr(Image.new("RGB", (64, 48)), None)
+    segments = read_metadata_segments(io.BytesIO(data))
+    assert len(segments) == 1
+    xmp = segments[0]
+    assert int.from_bytes(xmp[2:4], "big") + 2 == len(xmp)
+    assert b"hdrgm:Version" not in xmp and b"Container:Directory" not in xmp
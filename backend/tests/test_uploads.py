@@ -0,0 +1,140 @@
+"""Tests for the chunked upload store."""
+import asyncio
+import hashlib
+import threading
+
+import pytest
+
+from api.uploads import UploadManager, UploadNotFoundError, UploadRangeError
+
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+
+def write(manager: UploadManager, session, start: int, *parts: bytes):
+    return asyncio.run(manager.write_chunk(session, start, chunks(*parts)))
+
+
+def spooled(manager: UploadManager, session) -> bytes:
+    with open(manager._spool_path(session.id), "rb") as f:
+        return f.read()
+
+
+def upload(manager: UploadManager, user_id: str, data: bytes):
+    session = manager.create_session(user_id, "photo.jpg", len(data))
+    asyncio.run(manager.write_chunk(session, 0, chunks(data[:5], data[5:])))
+    return manager.finalize(session)
+
+
+def test_objects_are_only_visible_to_their_uploaders(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    uploaded = upload(manager, "alice", b"same bytes for everyone")
+
+    assert manager.get_object_path(uploaded.sha256, "alice") == uploaded.path
+    with pytest.raises(UploadNotFoundError):
+        manager.get_object_path(uploaded.sha256, "bob")
+
+    # Uploading the same content makes bob an owner of the shared object
+    assert upload(manager, "bob", b"same bytes for everyone").path == uploaded.path
+    assert manager.get_object_path(uploaded.sha256, "bob") == uploaded.path
+
+
+def test_expired_objects_drop_their_owners(tmp_path):
+    manager = UploadManager(str(tmp_path), object_ttl=-1)
+    uploaded = upload(manager, "alice", b"expiring")
+
+    assert manager.cleanup_expired() == 1
+    with pytest.raises(UploadNotFoundError):
+        manager.get_object_path(uploaded.sha256, "alice")
+    assert not (tmp_path / "owners" / uploaded.sha256[:2] / uploaded.sha256).exists()
+
+
+DATA = bytes(range(256)) * 4
+
+
+def test_upload_resumes_from_the_offset(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    session = manager.create_session("alice", "photo.jpg", len(DATA))
+    write(manager, session, 0, DATA[:300])
+    assert session.offset == 300
+
+    write(manager, session, 300, DATA[300:700], DATA[700:])
+    uploaded = manager.finalize(session)
+    assert uploaded.sha256 == hashlib.sha256(DATA).hexdigest()
+    with open(uploaded.path, "rb") as f:
+        assert f.read() == DATA
+
+
+def test_retried_range_skips_bytes_already_received(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    session = manager.create_session("alice", "photo.jpg", len(DATA))
+    write(manager, session, 0, DATA[:500])
+    # The client did not see the acknowledgement and resends from 200
+    write(manager, session, 200, DATA[200:600], DATA[600:])
+
+    assert spooled(manager, session) == DATA
+    assert manager.finalize(session).sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_gap_is_rejected_with_the_current_offset(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    session = manager.create_session("alice", "photo.jpg", len(DATA))
+    write(manager, session, 0, DATA[:100])
+
+    with pytest.raises(UploadRangeError) as error:
+        write(manager, session, 200, DATA[200:300])
+    # Returned to the client as 416 with the offset to resume from
+    assert error.value.offset == 100
+    assert session.offset == 100
+    assert not session.writing
+
+
+def test_data_past_the_declared_size_is_rejected(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    session = manager.create_session("alice", "photo.jpg", 10)
+    with pytest.raises(UploadRangeError):
+        write(manager, session, 0, b"0123456789", b"extra")
+    # What arrived within the declared size is kept
+    assert session.offset == 10
+    assert spooled(manager, session) == b"0123456789"
+
+
+def test_session_is_restored_after_a_restart(tmp_path):
+    manager = UploadManager(str(tmp_path))
+    session = manager.create_session("alice", "photo.jpg", len(DATA))
+    write(manager, session, 0, DATA[:400])
+
+    restarted = UploadManager(str(tmp_path))
+    restored = restarted.get_session(session.id, "alice")
+    assert restored.offset == 400
+    assert restored.hasher is None
+    with pytest.raises(UploadNotFoundError):
+        restarted.get_session(session.id, "bob")
+
+    write(restarted, restored, 400, DATA[400:])
+    assert restarted.finalize(restored).sha256 == hashlib.sha256(DATA).hexdigest()
+
+
+def test_rehash_and_writes_run_off_the_event_loop(tmp_path, monkeypatch):
+    manager = UploadManager(str(tmp_path))
+    session = manager.create_session("alice", "photo.jpg", len(DATA))
+    write(manager, session, 0, DATA[:400])
+
+    threads = []
+    rehash, write_data = UploadManager._rehash, UploadManager._write_data
+
+    def record(fn):
+        def wrapper(*args):
+            threads.append(threading.current_thread())
+            return fn(*args)
+        return wrapper
+
+    monkeypatch.setattr(UploadManager, "_rehash", record(rehash))
+    monkeypatch.setattr(UploadManager, "_write_data", staticmethod(record(write_data)))
+    restarted = UploadManager(str(tmp_path))
+    write(restarted, restarted.get_session(session.id, "alice"), 400, DATA[400:])
+
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads